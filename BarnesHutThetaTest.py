@@ -0,0 +1,54 @@
+from Core import *
+from matplotlib import pyplot as plt
+from time import time
+import numpy as np
+
+
+num_particles = 2000
+thetas = [0.1 * i for i in range(11)]
+softening = 0
+
+generator = np.random.default_rng(245)
+positions = generator.normal(size = (num_particles, 3)) * 1e11
+velocities = np.zeros((num_particles, 3))
+masses = generator.uniform(1e22, 1e24, num_particles)
+state = ArrayState(positions, velocities, masses, 0)
+
+force = Force(softening = softening)
+force.switch('n_body_vectorized')
+start_time = time()
+forces_ref = force.calculate_all(state)
+time_ref = time() - start_time
+
+force.switch('barnes_hut')
+errors = []
+times = []
+
+for theta in thetas:
+    force.theta = theta
+    force.tree_solver.tree = None
+    start_time = time()
+    forces = force.calculate_all(state)
+    times.append(time() - start_time)
+    difference = forces - forces_ref
+    error = np.sqrt(np.sum(difference * difference) / np.sum(forces_ref * forces_ref))
+    errors.append(error)
+
+print("theta    relative rms error    time (seconds)")
+print("n_body   {:<20.3e}  {:.3f}".format(0, time_ref))
+for theta, error, duration in zip(thetas, errors, times):
+    print("{:<8.2f} {:<20.3e}  {:.3f}".format(theta, error, duration))
+
+plt.semilogy(thetas[1:], errors[1:])
+plt.xlabel("Opening Angle")
+plt.ylabel("Relative RMS Force Error")
+plt.title("Barnes-Hut Error From n_body For Different Opening Angles")
+plt.show()
+
+plt.plot(thetas, times, label = 'barnes_hut')
+plt.axhline(time_ref, color = 'black', linestyle = '--', label = 'n_body_vectorized')
+plt.xlabel("Opening Angle")
+plt.ylabel("Time To Compute Forces (seconds)")
+plt.title("Barnes-Hut Duration For Different Opening Angles")
+plt.legend()
+plt.show()
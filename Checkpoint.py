@@ -0,0 +1,176 @@
+import json
+import os
+import queue
+import re
+import threading
+from time import monotonic
+import numpy as np
+from Core import ArrayState, EnsembleState, Force, History, Integrator, System
+
+
+def save_checkpoint(system, path):
+    """
+    Writes the latest state of a (System) with everything needed to continue it bit for bit to some path (str).
+    The file is written next to the path and renamed into place, so a crash never leaves a partial checkpoint.
+    """
+    write_checkpoint(snapshot(system), path)
+
+
+def snapshot(system):
+    """Returns a copy (dict) of everything a checkpoint of a (System) stores, taken without touching the disk"""
+    state = system.get_state(-1)
+    objects = not isinstance(state, ArrayState)
+    if objects:
+        state = ArrayState.from_state(state)
+    history = system.history
+    metadata = {'time': state.get_time(), 'dt': system.get_dt(), 'objects': objects,
+                'buffered': system.buffers is not None, 'integrator': system.integrator.get_settings(),
+                'force': system.force.get_settings(),
+                'history': {'mode': history.mode, 'size': history.size, 'count': history.count}}
+    arrays = {'positions': state.positions.copy(), 'velocities': state.velocities.copy(),
+              'masses': state.masses.copy()}
+    for name, value in system.integrator.get_auxiliary().items():
+        arrays['auxiliary_' + name] = np.array(value, copy = True)
+    return {'metadata': metadata, 'arrays': arrays}
+
+
+def write_checkpoint(data, path):
+    """Writes a snapshot (dict) to some path (str) atomically"""
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        np.savez(file, metadata = np.array(json.dumps(data['metadata'])), **data['arrays'])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path, integrator = None, force = None):
+    """
+    Rebuilds the (System) saved in a checkpoint at some path (str).
+    The integrator and force in use are switched to the saved selection and parameters, new ones are made if not given.
+    """
+    with np.load(path, allow_pickle = False) as data:
+        metadata = json.loads(str(data['metadata']))
+        arrays = {name: data[name] for name in data.files if name != 'metadata'}
+    integrator = Integrator() if integrator is None else integrator
+    force = Force() if force is None else force
+    if isinstance(metadata['integrator'], str):
+        integrator.switch(metadata['integrator'])
+    else:
+        integrator.set_settings(metadata['integrator'])
+    force.set_settings(metadata['force'])
+    integrator.set_auxiliary({name[len('auxiliary_'):]: value for name, value in arrays.items()
+                              if name.startswith('auxiliary_')})
+    state_type = EnsembleState if arrays['positions'].ndim == 3 else ArrayState
+    state = state_type(arrays['positions'], arrays['velocities'], arrays['masses'], metadata['time'])
+    if metadata['objects']:
+        state = state.to_state()
+    saved_history = metadata['history']
+    history = History(saved_history['mode'], saved_history['size'])
+    history.count = saved_history['count'] - 1
+    return System(state, integrator, force, metadata['dt'], buffered = metadata['buffered'], history = history)
+
+
+def latest_checkpoint(directory):
+    """Returns the path (str) of the newest readable checkpoint in some directory, None if there are none"""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.npz')]
+    for path in sorted(paths, key = lambda path: (os.path.getmtime(path), path), reverse = True):
+        try:
+            with np.load(path, allow_pickle = False) as data:
+                json.loads(str(data['metadata']))
+                data['positions']
+            return path
+        except Exception:
+            continue
+    return None
+
+
+def restart(directory, integrator = None, force = None):
+    """Returns the (System) of the newest readable checkpoint in some directory (str)"""
+    path = latest_checkpoint(directory)
+    if path is None:
+        raise FileNotFoundError("No readable checkpoint in " + str(directory))
+    return load_checkpoint(path, integrator, force)
+
+
+class Checkpointer:
+    """
+    Writes checkpoints of a System every some number of steps or wall-clock seconds.
+    The state is copied on the calling thread and written by a background thread, so stepping continues
+    while the file is written.
+    Attributes:
+        directory (str): The directory the checkpoints are written to.
+        every_steps (int): Steps between checkpoints, None to not checkpoint on steps.
+        every_seconds (float): Wall-clock seconds between checkpoints, None to not checkpoint on time.
+        keep (int): How many of the newest checkpoints to keep, counting checkpoints already in the directory.
+        written (list <str>): The paths of the kept checkpoints, oldest first.
+    """
+
+    def __init__(self, directory, every_steps = None, every_seconds = None, keep = 2):
+        """Initialises a Checkpointer writing into some directory (str) on a step (int) or time (float) interval keeping some number (int)"""
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.every_steps = every_steps
+        self.every_seconds = every_seconds
+        self.keep = keep
+        self.steps = 0
+        self.last_time = monotonic()
+        self.written = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                        if re.fullmatch(r'checkpoint_\d{12}\.npz', name)]
+        self.queue = queue.Queue(maxsize = 1)
+        self.error = None
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+
+    def due(self):
+        """Counts a step and returns whether a checkpoint is due (bool)"""
+        self.steps += 1
+        if self.every_steps is not None and self.steps >= self.every_steps:
+            return True
+        return self.every_seconds is not None and monotonic() - self.last_time >= self.every_seconds
+
+    def step(self, system):
+        """Called after every step of a (System), checkpointing it when due"""
+        if self.due():
+            self.save(system)
+
+    def save(self, system):
+        """Queues a checkpoint of a (System) now, waiting only if the previous one is still being written"""
+        if self.error is not None:
+            raise self.error
+        data = snapshot(system)
+        name = "checkpoint_{:012d}.npz".format(system.history.count - 1)
+        self.queue.put((data, os.path.join(self.directory, name)))
+        self.steps = 0
+        self.last_time = monotonic()
+
+    def run(self):
+        """Background thread writing the queued checkpoints"""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            data, path = item
+            try:
+                write_checkpoint(data, path)
+                if path in self.written:
+                    self.written.remove(path)
+                self.written.append(path)
+                while len(self.written) > self.keep:
+                    os.remove(self.written.pop(0))
+            except Exception as error:
+                self.error = error
+            self.queue.task_done()
+
+    def wait(self):
+        """Blocks until every queued checkpoint is written"""
+        self.queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Writes the queued checkpoints and stops the background thread"""
+        self.wait()
+        self.queue.put(None)
+        self.thread.join()
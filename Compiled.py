@@ -0,0 +1,154 @@
+import numpy as np
+try:
+    import numba
+except ImportError:
+    numba = None
+
+prange = range if numba is None else numba.prange
+
+
+class Backend:
+    """
+    The single switch between the Numba compiled kernels and the NumPy reference kernels.
+    The compiled kernels do the same arithmetic per element as the NumPy ones, only sums over particles
+    are taken in a different order, so results agree to rounding. Numba's threading layer is left to its own
+    configuration, the process pools of Sweep and Parallel spawn their workers rather than forking this process
+    so they never inherit its threads.
+    Attributes:
+        available (bool): Whether Numba could be imported.
+        enabled (bool): Whether the compiled kernels are wanted, on by default, turn it off to use NumPy.
+    """
+
+    def __init__(self):
+        """Initialises the switch, enabled whenever Numba is available"""
+        self.available = numba is not None
+        self.enabled = self.available
+
+    def active(self):
+        """Returns whether the compiled kernels are in use (bool)"""
+        return self.enabled and self.available
+
+
+backend = Backend()
+
+
+def jit(parallel = False):
+    """
+    Returns a decorator compiling a function with Numba in nopython mode, optionally across threads (bool).
+    The machine code is cached on disk next to this module, or in NUMBA_CACHE_DIR, so only the first run compiles.
+    Without Numba the function is returned unchanged, it is only called when the backend is active.
+    """
+    def decorate(func):
+        if numba is None:
+            return func
+        return numba.njit(cache = True, parallel = parallel)(func)
+    return decorate
+
+
+def set_threads(threads):
+    """Limits the parallel kernels to some number of threads (int), every thread Numba started if None"""
+    if numba is not None:
+        limit = numba.config.NUMBA_NUM_THREADS
+        numba.set_num_threads(limit if threads is None else max(1, min(threads, limit)))
+
+
+@jit(parallel = True)
+def pairwise_forces(positions, masses, G, start, stop):
+    """Returns the (stop-start,3) direct-sum forces (ndarray) on the targets start to stop (int) from every particle, splitting the targets across threads"""
+    n = len(masses)
+    forces = np.zeros((stop - start, 3))
+    for target in prange(stop - start):
+        i = start + target
+        x = positions[i, 0]
+        y = positions[i, 1]
+        z = positions[i, 2]
+        force_x = 0.0
+        force_y = 0.0
+        force_z = 0.0
+        for j in range(n):
+            dx = positions[j, 0] - x
+            dy = positions[j, 1] - y
+            dz = positions[j, 2] - z
+            square_distance = dx * dx + dy * dy + dz * dz
+            if square_distance != 0:
+                strength = masses[i] * (G * masses[j]) / (square_distance * np.sqrt(square_distance))
+                force_x += strength * dx
+                force_y += strength * dy
+                force_z += strength * dz
+        forces[target, 0] = force_x
+        forces[target, 1] = force_y
+        forces[target, 2] = force_z
+    return forces
+
+
+@jit(parallel = True)
+def batched_pairwise_forces(positions, masses, G):
+    """Returns the (B,N,3) direct-sum forces (ndarray) on every particle of B independent systems, splitting all B*N targets across threads"""
+    count, n = masses.shape
+    forces = np.zeros((count, n, 3))
+    for target in prange(count * n):
+        b = target // n
+        i = target % n
+        x = positions[b, i, 0]
+        y = positions[b, i, 1]
+        z = positions[b, i, 2]
+        force_x = 0.0
+        force_y = 0.0
+        force_z = 0.0
+        for j in range(n):
+            dx = positions[b, j, 0] - x
+            dy = positions[b, j, 1] - y
+            dz = positions[b, j, 2] - z
+            square_distance = dx * dx + dy * dy + dz * dz
+            if square_distance != 0:
+                strength = masses[b, i] * (G * masses[b, j]) / (square_distance * np.sqrt(square_distance))
+                force_x += strength * dx
+                force_y += strength * dy
+                force_z += strength * dz
+        forces[b, i, 0] = force_x
+        forces[b, i, 1] = force_y
+        forces[b, i, 2] = force_z
+    return forces
+
+
+@jit()
+def earth_core_forces(positions, masses, G, earth_mass, denominator):
+    """Returns the (K,3) earth core forces (ndarray) on K particles with (K,3) positions and (K,) masses"""
+    forces = np.empty_like(positions)
+    for i in range(len(masses)):
+        scale = -(G * masses[i] * earth_mass) / denominator
+        forces[i, 0] = scale * positions[i, 0]
+        forces[i, 1] = scale * positions[i, 1]
+        forces[i, 2] = scale * positions[i, 2]
+    return forces
+
+
+@jit()
+def scaled_add(out, x, scale, y):
+    """Writes x + scale * y into out (ndarray) for flat arrays in one pass, out may be x"""
+    for i in range(len(out)):
+        out[i] = x[i] + y[i] * scale
+
+
+@jit()
+def kahan_add(total, error, increment):
+    """Adds an increment (ndarray) to a total (ndarray) in place with Kahan summation for flat arrays, carrying the rounding error (ndarray)"""
+    for i in range(len(total)):
+        step = increment[i] - error[i]
+        result = total[i] + step
+        error[i] = (result - total[i]) - step
+        total[i] = result
+
+
+def warm_up():
+    """Loads every kernel from the cache, or compiles it, by calling it once on a tiny system if the backend is active"""
+    if not backend.active():
+        return
+    positions = np.zeros((2, 3))
+    masses = np.ones(2)
+    flat = np.zeros(6)
+    pairwise_forces(positions, masses, 1.0, 0, 2)
+    batched_pairwise_forces(positions[None], masses[None], 1.0)
+    earth_core_forces(positions, masses, 1.0, 1.0, 1.0)
+    scaled_add(flat, flat, 1.0, flat)
+    kahan_add(flat, np.zeros(6), flat)
@@ -1,5 +1,15 @@
 from Primitives import *
 from copy import deepcopy
+from collections import deque
+from math import comb
+import numpy as np
+from Kernels import PairwiseGravity, G
+from Tree import BarnesHut
+from Multipole import FastMultipole
+from Mesh import ParticleMesh
+from Kepler import propagate
+from Parallel import ParallelForces
+from Compiled import backend, earth_core_forces, scaled_add, kahan_add
 
 class Particle:
     """
@@ -10,6 +20,8 @@ class Particle:
         mass (float): The mass of the particle.
     """
 
+    __slots__ = ('position', 'velocity', 'mass')
+
     def __init__(self, position, velocity,  mass):
         """
         Initialises a Particle object.
@@ -31,6 +43,7 @@ class Particle:
     def step(self, past_state, integrator, force, dt):
         """
         Completes one physics step, returning the resultant particle.
+        The whole system is advanced once and reused by the other particles of the same state, see Integrator.integrate_particle.
         Args:
             past_state (SystenState): The previous state of the system from which the state of the new Particle can be found.
             integrator (Integrator): The Integrator object which computes the new state of the Particle.
@@ -56,6 +69,15 @@ class Particle:
     def get_momentum(self):
         return self.mass * self.velocity
 
+    def copy(self):
+        """Returns a new Particle (Particle) with copies of this Particles vectors"""
+        return Particle(self.position.copy(), self.velocity.copy(), self.mass)
+
+    def assign(self, position, velocity):
+        """Copies some position (Vector) and velocity (Vector) into this Particle in place"""
+        self.position.assign(position)
+        self.velocity.assign(velocity)
+
     def get_energy(self):
         G  = 6.6743015e-11
         kinetic_energy = (1/2) * self.mass * self.velocity.square_norm()
@@ -107,15 +129,17 @@ class SystemState:
             force (Force): A Force object to compute the force on a particle.
             dt (float): The small timestep overwhich the the numerical integration is calculated.
         """
-        new_system = SystemState([], self.time + dt, dt)
-        for i in range(len(self.particles)):
-            
-            #new_state = deepcopy(self)
-            #new_state.pop(i)
-            
-            new_particle = self.particles[i].step(self, integrator, force, dt)
-            new_system.add_particle(new_particle)
-        return new_system
+        return integrator.integrate(self, force, dt)
+
+    def copy(self, out = None):
+        """Returns a copy (SystemState) of this state with new Particle objects, or copies it into an output (SystemState)"""
+        if out is not None and out.num_particles() == self.num_particles():
+            for particle, out_particle in zip(self.particles, out.particles):
+                out_particle.assign(particle.position, particle.velocity)
+                out_particle.mass = particle.mass
+            out.time = self.time
+            return out
+        return SystemState([particle.copy() for particle in self.particles], self.time, None)
 
     def add_particle(self, particle):
         """
@@ -190,6 +214,347 @@ class SystemState:
     
 
 
+class VectorView(Vector):
+    """
+    Vector whose components live in a row of an (N,3) array, so reading a component reads the array and
+    assigning one, or updating the Vector in place, writes it. Operators returning a new Vector return a plain Vector.
+    Attributes:
+        row (ndarray): The (3,) row holding the x, y and z components.
+    """
+
+    __slots__ = ('row',)
+
+    def __init__(self, row):
+        """Initialises a view of some (3,) row (ndarray)"""
+        self.row = row
+
+    @property
+    def x(self):
+        return float(self.row[0])
+
+    @x.setter
+    def x(self, value):
+        self.row[0] = value
+
+    @property
+    def y(self):
+        return float(self.row[1])
+
+    @y.setter
+    def y(self, value):
+        self.row[1] = value
+
+    @property
+    def z(self):
+        return float(self.row[2])
+
+    @z.setter
+    def z(self, value):
+        self.row[2] = value
+
+
+class ParticleView(Particle):
+    """
+    Lazy view of a single particle stored inside an ArrayState.
+    The position and velocity are VectorViews of the underlying rows, so changing their components writes
+    the arrays, and assigning a whole Vector copies its components into them.
+    Attributes:
+        state (ArrayState): The state which owns the arrays.
+        index (int): The row of the particle in the state arrays.
+    """
+
+    __slots__ = ('state', 'index')
+
+    def __init__(self, state, index):
+        """Initialises a view of the ith (int) particle of some (ArrayState)"""
+        self.state = state
+        self.index = index
+
+    @property
+    def position(self):
+        return VectorView(self.state.positions[self.index])
+
+    @position.setter
+    def position(self, vector):
+        self.state.positions[self.index] = vector.transpose()
+
+    @property
+    def velocity(self):
+        return VectorView(self.state.velocities[self.index])
+
+    @velocity.setter
+    def velocity(self, vector):
+        self.state.velocities[self.index] = vector.transpose()
+
+    @property
+    def mass(self):
+        return float(self.state.masses[self.index])
+
+    @mass.setter
+    def mass(self, value):
+        self.state.masses[self.index] = value
+
+
+class ArrayState:
+    """
+    Structure of arrays version of SystemState, storing the whole system in contiguous numpy arrays.
+    Attributes:
+        positions (ndarray): (N,3) float64 array of the particle positions.
+        velocities (ndarray): (N,3) float64 array of the particle velocities.
+        masses (ndarray): (N,) float64 array of the particle masses.
+        time (float): The time for which the object holds system information for.
+    """
+
+    def __init__(self, positions, velocities, masses, time, dt = None):
+        """
+        Initialises an ArrayState object.
+        Args:
+            positions (array_like): (N,3) initial positions of the particles.
+            velocities (array_like): (N,3) initial velocities of the particles.
+            masses (array_like): (N,) masses of the particles.
+            time (float): the initial time of the system.
+        """
+        self.positions = np.ascontiguousarray(positions, dtype = np.float64).reshape(-1, 3)
+        self.velocities = np.ascontiguousarray(velocities, dtype = np.float64).reshape(-1, 3)
+        self.masses = np.ascontiguousarray(masses, dtype = np.float64).reshape(-1)
+        self.time = time
+        self.views = None
+
+    @classmethod
+    def from_particles(cls, particles, time):
+        """Builds an (ArrayState) from a (list <Particle>) at some time (float)"""
+        positions = [particle.get_position().transpose() for particle in particles]
+        velocities = [particle.get_velocity().transpose() for particle in particles]
+        masses = [particle.get_mass() for particle in particles]
+        return cls(positions, velocities, masses, time)
+
+    @classmethod
+    def from_state(cls, state):
+        """Builds an (ArrayState) holding the same particles as some (SystemState)"""
+        return cls.from_particles(state.get_particles(), state.get_time())
+
+    def to_state(self, out = None):
+        """Returns a (SystemState) of new Particle objects holding this state, or writes it into an output (SystemState)"""
+        if out is not None and out.num_particles() == self.num_particles():
+            for particle, position, velocity in zip(out.particles, self.positions.tolist(), self.velocities.tolist()):
+                particle.position.x, particle.position.y, particle.position.z = position
+                particle.velocity.x, particle.velocity.y, particle.velocity.z = velocity
+            out.time = self.time
+            return out
+        particles = []
+        for i in range(self.num_particles()):
+            position = Vector(*self.positions[i].tolist())
+            velocity = Vector(*self.velocities[i].tolist())
+            particles.append(Particle(position, velocity, self.masses[i]))
+        if out is not None:
+            out.particles = particles
+            out.time = self.time
+            return out
+        return SystemState(particles, self.time, None)
+
+    def copy(self, out = None):
+        """Returns a copy (ArrayState) of this state with its own arrays, or copies it into an output (ArrayState)"""
+        if out is not None and out.positions.shape == self.positions.shape:
+            out.positions[:] = self.positions
+            out.velocities[:] = self.velocities
+            out.assign_masses(self.masses)
+            out.time = self.time
+            return out
+        return type(self)(self.positions.copy(), self.velocities.copy(), self.masses.copy(), self.time)
+
+    def assign_masses(self, masses):
+        """Copies some masses (ndarray) into this state's masses, replacing its array if the shape differs or it shares memory with them"""
+        if self.masses.shape != masses.shape or np.may_share_memory(self.masses, masses):
+            self.masses = masses.copy()
+        else:
+            self.masses[:] = masses
+
+    def __str__(self):
+        """Returns a string displaying all the particles as a Particle.__str__. """
+        string = ' '
+        for particle in self.get_particles():
+            string += "\n"
+            string += str( particle )
+        return string
+
+    def step(self, integrator, force, dt):
+        """"
+        Computes a the next state of the system after a small time step.
+        Args:
+            integrator (Integrator): An Integrator to compute the numerical integration.
+            force (Force): A Force object to compute the force on a particle.
+            dt (float): The small timestep overwhich the the numerical integration is calculated.
+        """
+        return integrator.integrate(self, force, dt)
+
+    def add_particle(self, particle):
+        """
+        Adds a particle to the ArrayState.
+        Args:
+            particle (Particle): Adds a copy of this Particle to the ArrayState.
+        """
+        self.positions = np.vstack([self.positions, particle.get_position().transpose()])
+        self.velocities = np.vstack([self.velocities, particle.get_velocity().transpose()])
+        self.masses = np.append(self.masses, particle.get_mass())
+        self.views = None
+
+    def get_particle(self, i):
+        """Returns a view (ParticleView) of the ith (int) particle"""
+        return self.get_particles()[i]
+
+    def get_particles(self):
+        """Returns views of all the particles (list <ParticleView>)"""
+        if self.views is None:
+            self.views = [ParticleView(self, i) for i in range(self.num_particles())]
+        return self.views
+
+    def get_positions(self):
+        """Returns the (N,3) positions (ndarray)"""
+        return self.positions
+
+    def get_velocities(self):
+        """Returns the (N,3) velocities (ndarray)"""
+        return self.velocities
+
+    def get_masses(self):
+        """Returns the (N,) masses (ndarray)"""
+        return self.masses
+
+    def get_time(self):
+        """Returns the simulation time of this state (float)"""
+        return self.time
+
+    def num_particles(self):
+        """Returns the number of particles stored in the state (int)"""
+        return len(self.masses)
+
+    def __mul__(self, other):
+        """Compares this and some other (SystemState) or (ArrayState) returns the error (float) between them """
+        if not isinstance(other, ArrayState):
+            other = ArrayState.from_state(other)
+        difference = self.positions - other.positions
+        return float(np.mean(np.sqrt(np.sum(difference * difference, axis = 1))))
+
+    def total_momentum(self):
+        """Returns the total momentum of the state (Vector)"""
+        momentum = self.masses @ self.velocities
+        return Vector(*momentum.tolist())
+
+    def centre_mass(self):
+        """Returns the centre of mass of the state (Vector)"""
+        centre = (self.masses @ self.positions) / np.sum(self.masses)
+        return Vector(*centre.tolist())
+
+    def remove(self, particle):
+        """Removes the particle viewed by some input (ParticleView)"""
+        self.pop(particle.index)
+
+    def pop(self, index):
+        """Removes the ith (int) particle and returns a copy of it (Particle)"""
+        particle = Particle(Vector(*self.positions[index].tolist()),
+                            Vector(*self.velocities[index].tolist()),
+                            self.masses[index])
+        self.positions = np.delete(self.positions, index, axis = 0)
+        self.velocities = np.delete(self.velocities, index, axis = 0)
+        self.masses = np.delete(self.masses, index)
+        self.views = None
+        return particle
+
+    def get_energy(self):
+        """Finds the states energy for a earth_core system (float)"""
+        earth_mass = 5.97219e24
+        earth_radius = 6378137
+        G = 6.6743015e-11
+        kinetic_energy = 0.5 * self.masses * np.sum(self.velocities * self.velocities, axis = 1)
+        stiffness = G * earth_mass / (earth_radius * earth_radius * earth_radius)
+        potential_energy = stiffness * self.masses * np.sum(self.positions * self.positions, axis = 1)
+        return float(np.sum(kinetic_energy + potential_energy))
+
+
+class EnsembleState(ArrayState):
+    """
+    Batch of independent systems with the same number of particles, stacked along a leading axis so the
+    integrators and forces advance every member in one vectorised call. The members share the time, and
+    adaptive methods take the steps needed by the hardest member.
+    Attributes:
+        positions (ndarray): (B,N,3) float64 array of the particle positions of every member.
+        velocities (ndarray): (B,N,3) float64 array of the particle velocities of every member.
+        masses (ndarray): (B,N) float64 array of the particle masses of every member.
+        time (float): The time shared by every member.
+    """
+
+    def __init__(self, positions, velocities, masses, time, dt = None):
+        """
+        Initialises an EnsembleState object.
+        Args:
+            positions (array_like): (B,N,3) initial positions of the particles.
+            velocities (array_like): (B,N,3) initial velocities of the particles.
+            masses (array_like): (B,N) masses of the particles, or (N,) masses shared by every member.
+            time (float): the initial time of every member.
+        """
+        positions = np.ascontiguousarray(positions, dtype = np.float64)
+        self.positions = positions.reshape(len(positions), -1, 3)
+        self.velocities = np.ascontiguousarray(velocities, dtype = np.float64).reshape(self.positions.shape)
+        masses = np.asarray(masses, dtype = np.float64)
+        self.masses = np.array(np.broadcast_to(masses, self.positions.shape[:2]))
+        self.time = time
+        self.views = None
+
+    @classmethod
+    def from_states(cls, states):
+        """Builds an (EnsembleState) with one member for each of some states (list <SystemState>) or (list <ArrayState>)"""
+        states = [state if isinstance(state, ArrayState) else ArrayState.from_state(state) for state in states]
+        return cls([state.positions for state in states], [state.velocities for state in states],
+                   [state.masses for state in states], states[0].get_time())
+
+    def member(self, i):
+        """Returns the ith (int) member as an (ArrayState) viewing this state's arrays"""
+        return ArrayState(self.positions[i], self.velocities[i], self.masses[i], self.time)
+
+    def members(self):
+        """Returns every member (list <ArrayState>)"""
+        return [self.member(i) for i in range(self.num_members())]
+
+    def num_members(self):
+        """Returns the number of systems in the ensemble (int)"""
+        return len(self.positions)
+
+    def num_particles(self):
+        """Returns the number of particles in each member (int)"""
+        return self.positions.shape[1]
+
+    def to_state(self, out = None):
+        """Returns a (list <SystemState>) with one state for each member, or writes them into an output (list <SystemState>)"""
+        return [member.to_state(None if out is None else out[i]) for i, member in enumerate(self.members())]
+
+    def get_particles(self):
+        """Particle views are per member, select one with member"""
+        raise TypeError('an EnsembleState has no single list of particles, select a member first')
+
+    def __str__(self):
+        """Returns a string displaying every member as an ArrayState.__str__"""
+        return ''.join('\nmember %d:%s' % (i, member) for i, member in enumerate(self.members()))
+
+    def __mul__(self, other):
+        """Compares this and another (EnsembleState), or one state every member is compared to, returning the error of each member (ndarray)"""
+        if not isinstance(other, ArrayState):
+            other = ArrayState.from_state(other)
+        difference = self.positions - other.positions
+        return np.mean(np.sqrt(np.sum(difference * difference, axis = -1)), axis = -1)
+
+    def total_momentum(self):
+        """Returns the (B,3) total momentum of each member (ndarray)"""
+        return np.einsum('bn,bnk->bk', self.masses, self.velocities)
+
+    def centre_mass(self):
+        """Returns the (B,3) centre of mass of each member (ndarray)"""
+        return np.einsum('bn,bnk->bk', self.masses, self.positions) / np.sum(self.masses, axis = 1)[:, None]
+
+    def get_energy(self):
+        """Finds the energy of each member for a earth_core system (ndarray)"""
+        return np.array([member.get_energy() for member in self.members()])
+
+
 class Force:
 
     def earth_gravity(self, particle, state):
@@ -205,8 +570,7 @@ class Force:
             denominator = displacement.norm() * displacement.square_norm()
             if other_particle != particle and denominator != 0:
                 numerator = G * other_particle.get_mass() * particle.get_mass()
-                attraction_force = (numerator / denominator) * displacement
-                total_force += attraction_force
+                total_force.add_scaled(displacement, numerator / denominator)
         return total_force
 
     def earth_core(self, particle, state):
@@ -215,18 +579,228 @@ class Force:
         earth_radius = 6378137
         G = 6.6743015e-11
         
-        distance = particle.get_position()
         numerator = G * particle.get_mass() * earth_mass
         denominator = earth_radius * earth_radius * earth_radius
         force = (-numerator / denominator) * particle.get_position()
         return force
-        
 
-    def __init__(self, G = 1):
-        """Initialises a force object (Force)"""
+    def earth_gravity_ensemble(self, state):
+        """Returns the (B,N,3) earth surface gravity (ndarray) on every particle of an (EnsembleState)"""
+        return np.broadcast_to(np.array([0, -9.81, 0], dtype = np.float64), state.positions.shape).copy()
+
+    def earth_core_system(self, state):
+        """Returns the (N,3) or (B,N,3) earth core forces (ndarray) on every particle of an (ArrayState) or (EnsembleState)"""
+        earth_mass = 5.97219e24
+        earth_radius = 6378137
+        G = 6.6743015e-11
+
+        if backend.active():
+            forces = earth_core_forces(state.positions.reshape(-1, 3), state.masses.reshape(-1), G, earth_mass,
+                                       float(earth_radius * earth_radius * earth_radius))
+            return forces.reshape(state.positions.shape)
+        numerator = G * state.masses * earth_mass
+        denominator = earth_radius * earth_radius * earth_radius
+        return (-numerator / denominator)[..., None] * state.positions
+
+    def n_body_ensemble(self, state):
+        """Returns the (B,N,3) n-body forces (ndarray) on every particle of an (EnsembleState)"""
+        self.pairwise_gravity.threads = self.threads
+        return self.pairwise_gravity.batched_forces(state.positions, state.masses)
+
+    def n_body_vectorized(self, particle, state):
+        """Returns the n-body force for a (Particle) and (SystemState) using the whole system kernel"""
+        return self.from_system(particle, state, self.n_body_vectorized_system, self.n_body_vectorized_single)
+
+    def n_body_vectorized_system(self, state):
+        """Returns the (N,3) n-body forces (ndarray) on every particle of an (ArrayState)"""
+        self.pairwise_gravity.threads = self.threads
+        parallel = self.parallel(state)
+        if parallel is not None:
+            return parallel.pairwise_forces(state.positions, state.masses, self.pairwise_gravity.G,
+                                            self.pairwise_gravity.block_size)
+        return self.pairwise_gravity.forces(state.positions, state.masses)
+
+    def parallel(self, state):
+        """Returns the (ParallelForces) pool to split a whole system evaluation of an (ArrayState) across, None to run it in this process"""
+        if self.workers == 1 or state.num_particles() < self.parallel_threshold:
+            return None
+        if self.parallel_solver is None or self.parallel_workers != self.workers:
+            if self.parallel_solver is not None:
+                self.parallel_solver.close()
+            self.parallel_solver = ParallelForces(self.workers)
+            self.parallel_workers = self.workers
+        return self.parallel_solver
+
+    def n_body_vectorized_single(self, particle, state):
+        """Returns the n-body force (Vector) on a (Particle) which is not part of the (ArrayState)"""
+        position = particle.get_position().transpose()
+        force = self.pairwise_gravity.force_on(position, particle.get_mass(), state.positions, state.masses)
+        return Vector(*force.tolist())
+
+    def barnes_hut(self, particle, state):
+        """Returns the Barnes-Hut approximation of the n-body force for a (Particle) and (SystemState)"""
+        return self.from_system(particle, state, self.barnes_hut_system, self.barnes_hut_single)
+
+    def barnes_hut_system(self, state):
+        """Returns the (N,3) Barnes-Hut forces (ndarray) on every particle of an (ArrayState)"""
+        self.tree_solver.theta = self.theta
+        self.tree_solver.softening = self.softening
+        parallel = self.parallel(state)
+        if parallel is not None:
+            tree = self.tree_solver.build(state.positions, state.masses)
+            return parallel.tree_forces(tree, self.theta, self.softening, self.tree_solver.G)
+        return self.tree_solver.forces(state.positions, state.masses)
+
+    def barnes_hut_single(self, particle, state):
+        """Returns the Barnes-Hut force (Vector) on a (Particle) which is not part of the (ArrayState)"""
+        self.tree_solver.theta = self.theta
+        self.tree_solver.softening = self.softening
+        position = particle.get_position().transpose()
+        force = self.tree_solver.force_on(position, particle.get_mass(), state.positions, state.masses)
+        return Vector(*force.tolist())
+
+    def fast_multipole(self, particle, state):
+        """Returns the Fast Multipole Method approximation of the n-body force for a (Particle) and (SystemState)"""
+        return self.from_system(particle, state, self.fast_multipole_system, self.n_body_vectorized_single)
+
+    def fast_multipole_system(self, state):
+        """Returns the (N,3) Fast Multipole Method forces (ndarray) on every particle of an (ArrayState)"""
+        self.multipole_solver.order = self.order
+        self.multipole_solver.tolerance = self.tolerance
+        return self.multipole_solver.forces(state.positions, state.masses)
 
-        self.force_enum = Enum([self.earth_gravity, self.n_body, self.earth_core])
+    def particle_mesh(self, particle, state):
+        """Returns the particle-mesh approximation of the n-body force for a (Particle) and (SystemState)"""
+        return self.from_system(particle, state, self.particle_mesh_system, self.n_body_vectorized_single)
+
+    def particle_mesh_system(self, state):
+        """Returns the (N,3) particle-mesh forces (ndarray) on every particle of an (ArrayState)"""
+        self.mesh_solver.grid_size = self.grid_size
+        self.mesh_solver.periodic = self.periodic
+        self.mesh_solver.box_size = self.box_size
+        return self.mesh_solver.forces(state.positions, state.masses)
+
+    def n_body_symmetric(self, particle, state):
+        """Returns the n-body force for a (Particle) and (SystemState) evaluating each pair of particles once"""
+        return self.from_system(particle, state, self.n_body_symmetric_system, self.n_body_vectorized_single)
+
+    def n_body_symmetric_system(self, state):
+        """Returns the (N,3) n-body forces (ndarray) on every particle of an (ArrayState) evaluating each pair once"""
+        return self.pairwise_gravity.symmetric_forces(state.positions, state.masses)
+
+    def n_body_active(self, state, indices):
+        """Returns the (K,3) n-body forces (ndarray) and their (K,3) time derivatives (ndarray) on some particles (ndarray) of an (ArrayState)"""
+        return self.pairwise_gravity.forces_and_jerks(indices, state.positions, state.velocities, state.masses)
+
+    def n_body_symmetric_objects(self, state):
+        """Returns the n-body forces (list <Vector>) on every particle of a (SystemState) evaluating each pair once"""
+        G = 6.6743015e-11
+        particles = state.get_particles()
+        forces = [Vector(0, 0, 0) for particle in particles]
+        for i in range(len(particles)):
+            particle = particles[i]
+            for j in range(i + 1, len(particles)):
+                other_particle = particles[j]
+                displacement = other_particle.get_position() - particle.get_position()
+                denominator = displacement.norm() * displacement.square_norm()
+                if denominator != 0:
+                    numerator = G * other_particle.get_mass() * particle.get_mass()
+                    forces[i].add_scaled(displacement, numerator / denominator)
+                    forces[j].add_scaled(displacement, -numerator / denominator)
+        return forces
+
+    def from_system(self, particle, state, system_func, single_func):
+        """
+        Finds the force on one particle from a whole system force function.
+        The whole system evaluation is cached, so calling this for every particle of a state
+        only evaluates the system once, and changing the force settings invalidates it.
+        Args:
+            particle (Particle): The particle the force acts on.
+            state (SystemState): The state the force is computed from.
+            system_func (function): Maps an (ArrayState) to the (N,3) forces on all its particles.
+            single_func (function): Maps a (Particle) and (ArrayState) to the force on a particle outside the state.
+        Returns:
+            The force (Vector) on the particle.
+        """
+        if not isinstance(state, ArrayState):
+            array_state = ArrayState.from_state(state)
+            if particle in state.get_particles():
+                particle = array_state.get_particle(state.get_particles().index(particle))
+            state = array_state
+        if not (isinstance(particle, ParticleView) and particle.state is state):
+            return single_func(particle, state)
+        settings = self.get_settings()
+        if (self.cache_func != system_func.__name__
+                or self.cache_settings != settings
+                or not np.array_equal(self.cache_positions, state.positions)
+                or not np.array_equal(self.cache_masses, state.masses)):
+            self.cache_forces = system_func(state)
+            self.cache_func = system_func.__name__
+            self.cache_settings = settings
+            self.cache_positions = state.positions.copy()
+            self.cache_masses = state.masses.copy()
+        return Vector(*self.cache_forces[particle.index].tolist())
+
+    def __init__(self, G = 1, theta = 0.5, softening = 0.0, order = 4, tolerance = None,
+                 grid_size = 64, periodic = False, box_size = None, workers = 1, threads = 1):
+        """
+        Initialises a force object (Force).
+        Args:
+            theta (float): The Barnes-Hut opening angle.
+            softening (float): The Barnes-Hut Plummer softening length.
+            order (int): The Fast Multipole Method expansion order.
+            tolerance (float): If set, the Fast Multipole Method picks the order to meet this relative error.
+            grid_size (int): The number of particle-mesh cells along each side.
+            periodic (bool): Whether the particle-mesh box is periodic rather than isolated.
+            box_size (float): The side of the periodic box, the bounding cube of the particles if None.
+            workers (int): The number of processes the n-body and Barnes-Hut forces are split across for
+                at least parallel_threshold particles, every core if None.
+            threads (int): The size of the thread pool the direct-sum forces are tiled across, every core if None.
+        The number of whole system force evaluations is counted in evaluations (int), an (EnsembleState)
+        counts one for each member.
+        """
+
+        self.force_enum = Enum([self.earth_gravity, self.n_body, self.earth_core,
+                                self.n_body_vectorized, self.barnes_hut, self.fast_multipole,
+                                self.particle_mesh, self.n_body_symmetric])
+        self.system_forces = {'earth_core': self.earth_core_system,
+                              'n_body_vectorized': self.n_body_vectorized_system,
+                              'barnes_hut': self.barnes_hut_system,
+                              'fast_multipole': self.fast_multipole_system,
+                              'particle_mesh': self.particle_mesh_system,
+                              'n_body_symmetric': self.n_body_symmetric_system}
+        self.object_forces = {'n_body_symmetric': self.n_body_symmetric_objects}
+        self.active_forces = {'n_body': self.n_body_active,
+                              'n_body_vectorized': self.n_body_active,
+                              'n_body_symmetric': self.n_body_active}
+        self.ensemble_forces = {'earth_gravity': self.earth_gravity_ensemble,
+                                'earth_core': self.earth_core_system,
+                                'n_body': self.n_body_ensemble,
+                                'n_body_vectorized': self.n_body_ensemble,
+                                'n_body_symmetric': self.n_body_ensemble}
         self.G = G
+        self.theta = theta
+        self.softening = softening
+        self.order = order
+        self.tolerance = tolerance
+        self.pairwise_gravity = PairwiseGravity(threads = threads)
+        self.threads = threads
+        self.tree_solver = BarnesHut(theta, softening)
+        self.grid_size = grid_size
+        self.periodic = periodic
+        self.box_size = box_size
+        self.multipole_solver = FastMultipole(order, tolerance)
+        self.mesh_solver = ParticleMesh(grid_size, periodic, box_size)
+        self.cache_func = None
+        self.cache_settings = None
+        self.cache_positions = None
+        self.cache_masses = None
+        self.cache_forces = None
+        self.evaluations = 0
+        self.workers = workers
+        self.parallel_threshold = 4096
+        self.parallel_solver = None
+        self.parallel_workers = None
 
     def cycle(self, n = 1):
         """Cycles through the different force calculation functions (int)"""
@@ -242,106 +816,1086 @@ class Force:
             if method.__name__ == string:
                 self.force_enum.set(method)
 
+    def get_settings(self):
+        """Returns the name of the force in use and its parameters (dict)"""
+        return {'name': self.force_enum.get_state().__name__, 'G': self.G, 'theta': self.theta,
+                'softening': self.softening, 'order': self.order, 'tolerance': self.tolerance,
+                'grid_size': self.grid_size, 'periodic': self.periodic, 'box_size': self.box_size,
+                'workers': self.workers, 'threads': self.threads}
+
+    def set_settings(self, settings):
+        """Switches to the force and parameters (dict) returned by get_settings"""
+        for name, value in settings.items():
+            if name != 'name':
+                setattr(self, name, value)
+        self.switch(settings['name'])
+
     def calculate(self, particle, state):
         """calculates the force for a (Particle) and (SystemState)"""
         func = self.force_enum.get_state()
         out = func(particle, state)
         return out
 
-    def new_force(self, force):
+    def calculate_all(self, state):
+        """
+        calculates the (N,3) forces (ndarray) on every particle of a (SystemState) or (ArrayState), or the (B,N,3)
+        forces of an (EnsembleState), in one call for forces with an ensemble version and member by member otherwise
+        """
+        func = self.force_enum.get_state()
+        if isinstance(state, EnsembleState):
+            ensemble_func = self.ensemble_forces.get(func.__name__)
+            if ensemble_func is None:
+                return np.stack([self.calculate_all(member) for member in state.members()])
+            self.evaluations += state.num_members()
+            return ensemble_func(state)
+        self.evaluations += 1
+        object_func = self.object_forces.get(func.__name__)
+        if object_func is not None and not isinstance(state, ArrayState):
+            forces = [force.transpose() for force in object_func(state)]
+            return np.array(forces, dtype = np.float64).reshape(-1, 3)
+        system_func = self.system_forces.get(func.__name__)
+        if system_func is None:
+            forces = [func(particle, state).transpose() for particle in state.get_particles()]
+            return np.array(forces, dtype = np.float64).reshape(-1, 3)
+        if not isinstance(state, ArrayState):
+            state = ArrayState.from_state(state)
+        return system_func(state)
+
+    def calculate_objects(self, state):
+        """calculates the forces (list <Vector>) on every particle of a (SystemState) in one batched call"""
+        func = self.force_enum.get_state()
+        object_func = self.object_forces.get(func.__name__)
+        if func.__name__ in self.system_forces and object_func is None:
+            return [Vector(*force) for force in self.calculate_all(state).tolist()]
+        self.evaluations += 1
+        if object_func is not None:
+            return object_func(state)
+        return [func(particle, state) for particle in state.get_particles()]
+
+    def calculate_active(self, state, indices):
+        """
+        Calculates the forces and their time derivatives on some particles of an (ArrayState).
+        Forces without an analytic version differentiate two whole system evaluations along the velocities.
+        Args:
+            state (ArrayState): The state the forces are computed from.
+            indices (ndarray): The indices of the particles the forces act on.
+        Returns:
+            The (K,3) forces (ndarray) and (K,3) jerks (ndarray) on the K particles.
+        """
+        func = self.force_enum.get_state()
+        active_func = self.active_forces.get(func.__name__)
+        if active_func is not None:
+            self.evaluations += 1
+            return active_func(state, indices)
+        forces = self.calculate_all(state)
+        speed = np.abs(state.velocities).max()
+        if speed == 0:
+            return forces[indices], np.zeros((len(indices), 3))
+        extent = np.abs(state.positions - state.positions.mean(axis = 0)).max()
+        epsilon = 1e-7 * (extent if extent > 0 else 1.0) / speed
+        shifted = ArrayState(state.positions + epsilon * state.velocities, state.velocities, state.masses, state.time)
+        jerks = (self.calculate_all(shifted) - forces) / epsilon
+        return forces[indices], jerks[indices]
+
+    def new_force(self, force, system_force = None, object_force = None, active_force = None, ensemble_force = None):
+        """
+        Adds a force function (function) with optional whole system versions for arrays (function) and objects (function),
+        an optional version (function) returning the forces and jerks on some particles of an ArrayState and an
+        optional version (function) returning the forces on every member of an EnsembleState
+        """
         self.force_enum.add(force)
+        if system_force is not None:
+            self.system_forces[force.__name__] = system_force
+        if object_force is not None:
+            self.object_forces[force.__name__] = object_force
+        if active_force is not None:
+            self.active_forces[force.__name__] = active_force
+        if ensemble_force is not None:
+            self.ensemble_forces[force.__name__] = ensemble_force
 
 class Integrator:
+    """
+    Numerical integration methods which advance a whole system by one timestep.
+    Every method takes an (ArrayState), (Force) and timestep (float) and returns the next (ArrayState),
+    each stage is a full system state so a method makes one batched force call per stage.
+    Methods with an _objects version step a (SystemState) of Particles in place, other methods
+    step a (SystemState) through an ArrayState.
+    Every method accepts an optional output state which the result is written into instead of
+    allocating a new state, intermediate stages are reused between steps.
+    The methods once took a (Particle), (SystemState), (Force) and timestep (float) and returned the next
+    Particle, integrate still accepts that form for a single particle.
+    Adaptive methods split each timestep into as many internal steps as their tolerances need.
+    An (EnsembleState) is advanced in one vectorised call by the methods in ensemble_methods, with adaptive
+    steps shared by every member, and member by member by the other methods.
+    Attributes:
+        rtol (float): The relative tolerance of adaptive methods.
+        atol (float): The absolute tolerance of adaptive methods.
+        accepted_steps (int): The steps taken, internal steps for adaptive methods.
+        rejected_steps (int): The internal steps adaptive methods rejected and retried.
+        epsilon (float): The Gauss-Radau accuracy parameter, the size of the last acceleration coefficient relative to the accelerations.
+        extrapolation_depths (ndarray): How many Bulirsch-Stoer steps used each number of extrapolation columns.
+        block_eta (float): The block timestep accuracy parameter.
+        block_levels (int): The most times a block timestep halves the timestep.
+        active_per_level (ndarray): How many particle steps block timesteps took at each level.
+    """
 
-    def euler_forwards(self, particle, state, force, dt):
-        """Input (Particle), (SystemState), (Force), timestep (float) return next (Particle)"""
-        position = particle.get_position() + particle.get_velocity() * dt
-        particle_force = force.calculate(particle, state)
-        acceleration = particle_force / particle.get_mass()
-        velocity = particle.get_velocity() + acceleration * dt
-        return Particle(position, velocity, particle.get_mass())
-    
-    def euler_back(self, particle, state, force, dt):
-        """Input (Particle), (SystemState), (Force), timestep (float) return next (Particle)"""
-        position = particle.get_position() + particle.get_velocity() * dt
-        test_particle = Particle(position, particle.get_velocity(), particle.get_mass())
-        particle_force = force.calculate(test_particle, state)
-        acceleration = particle_force / particle.get_mass()
-        velocity = particle.get_velocity() + acceleration * dt
-        return Particle(position, velocity, particle.get_mass())
-
-    def semi_implicit_euler(self, particle, state, force, dt):
-        """Input (Particle), (SystemState), (Force), timestep (float) return next (Particle)"""
-        particle_force = force.calculate(particle, state)
-        acceleration = particle_force / particle.get_mass()
-        velocity = particle.get_velocity() + acceleration * dt
-        position = particle.get_position() + velocity * dt
-        return Particle(position, velocity, particle.get_mass())
-
-    def midpoint(self, particle, state, force, dt):
-        particle_force = force.calculate(particle, state)
-        acceleration = particle_force / particle.get_mass()
-        velocity_mid = particle.get_velocity() + acceleration * dt * 0.5
-        position_mid = particle.get_position() + velocity_mid * dt * 0.5
-        ref_particle = Particle(position_mid, velocity_mid, particle.get_mass())
-        particle_force = force.calculate(ref_particle, state)
-        acceleration_mid = particle_force / particle.get_mass()
-        velocity = particle.get_velocity() + acceleration_mid * dt
-        position = particle.get_position() + velocity * dt
-        return Particle(position, velocity, particle.get_mass())
-
-    def rk4(self, particle, state, force, dt):
-        """Input (Particle), (SystemState), (Force), timestep (float) return next (Particle)"""
-        mass = particle.get_mass()
-        k1 = force.calculate(particle, state)
-        k2_particle = Particle(
-            particle.get_position() + 0.5 * particle.get_velocity() * dt,
-            particle.get_velocity() + 0.5 * k1 * dt / mass,
-            particle.get_mass())
-        k2 = force.calculate(k2_particle, state)
-        k3_particle = Particle(
-            particle.get_position() + 0.5 * k2_particle.get_velocity() * dt,
-            particle.get_velocity() + 0.5 * k2 * dt / mass,
-            particle.get_mass())
-        k3 = force.calculate(k3_particle, state)
-        k4_particle = Particle(
-            particle.get_position() + k3_particle.get_velocity() * dt,
-            particle.get_velocity() + k3 * dt / mass,
-            particle.get_mass())
-        k4 = force.calculate(k4_particle, state)
-        particle_force = (1/6) * (k1 + 2*k2 + 2*k3 + k4)
-        acceleration = particle_force / particle.get_mass()
-        velocity = particle.get_velocity() + acceleration * dt
-        position = particle.get_position() + particle.get_velocity() * dt
-        return Particle(position, velocity, particle.get_mass())
-
-    def verlet(self, particle, state, force, dt):
-        """Input (Particle), (SystemState), (Force), timestep (float) return next (Particle)"""
+    dormand_prince_nodes = [0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1]
+    dormand_prince_matrix = [[1 / 5],
+                             [3 / 40, 9 / 40],
+                             [44 / 45, -56 / 15, 32 / 9],
+                             [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+                             [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+                             [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]]
+    dormand_prince_error = [71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40]
+    yoshida4_weights = [1 / (2 - 2 ** (1 / 3)), -2 ** (1 / 3) / (2 - 2 ** (1 / 3)), 1 / (2 - 2 ** (1 / 3))]
+    yoshida6_weights = [0.784513610477560, 0.235573213359357, -1.17767998417887,
+                        1 - 2 * (0.784513610477560 + 0.235573213359357 - 1.17767998417887),
+                        -1.17767998417887, 0.235573213359357, 0.784513610477560]
+    block_names = ['positions', 'velocities', 'masses', 'accelerations', 'jerks', 'levels']
+    extrapolation_sequence = [2, 4, 6, 8, 10, 12, 14, 16]
+    radau_safety = 0.25
+    radau_iterations = 12
+    safety = 0.9
+    controller_beta = 0.04
+    min_shrink = 0.2
+    max_growth = 10.0
+
+    def accelerations(self, state, force):
+        """Returns the (N,3) accelerations (ndarray) of every particle of an (ArrayState)"""
+        return force.calculate_all(state) / state.masses[..., None]
+
+    def target(self, state, out, time):
+        """Returns the (ArrayState) a method writes into at some time (float), a new one unless an output (ArrayState) is given"""
+        if out is None:
+            return type(state)(np.empty_like(state.positions), np.empty_like(state.velocities), state.masses.copy(), time)
+        if out.positions.shape != state.positions.shape:
+            out.positions = np.empty_like(state.positions)
+            out.velocities = np.empty_like(state.velocities)
+            out.views = None
+        out.assign_masses(state.masses)
+        out.time = time
+        return out
+
+    def stage(self, state, k, time):
+        """Returns the kth reusable intermediate (ArrayState) shaped like some (ArrayState) at some time (float)"""
+        while len(self.array_stages) <= k:
+            self.array_stages.append(None)
+        stage = self.array_stages[k]
+        if stage is None or stage.positions.shape != state.positions.shape:
+            stage = state.copy()
+            self.array_stages[k] = stage
+        stage.masses = state.masses
+        stage.time = time
+        return stage
+
+    def axpy(self, out, x, scale, y):
+        """Writes x + scale * y into out (ndarray) without allocating, out must not be x"""
+        if backend.active() and out.flags.c_contiguous and x.shape == out.shape and y.shape == out.shape:
+            scaled_add(out.reshape(-1), x.reshape(-1), scale, y.reshape(-1))
+            return out
+        np.multiply(y, scale, out = out)
+        out += x
+        return out
+
+    def add_scaled(self, out, scale, y):
+        """Adds scale * y to out (ndarray) in place"""
+        if backend.active() and out.flags.c_contiguous and y.shape == out.shape:
+            flat = out.reshape(-1)
+            scaled_add(flat, flat, scale, y.reshape(-1))
+            return out
+        out += scale * y
+        return out
+
+    def euler_forwards(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        acceleration = self.accelerations(state, force)
+        new_state = self.target(state, out, state.time + dt)
+        self.axpy(new_state.positions, state.positions, dt, state.velocities)
+        self.axpy(new_state.velocities, state.velocities, dt, acceleration)
+        return new_state
+
+    def euler_back(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        new_state = self.target(state, out, state.time + dt)
+        self.axpy(new_state.positions, state.positions, dt, state.velocities)
+        new_state.velocities[:] = state.velocities
+        acceleration = self.accelerations(new_state, force)
+        self.add_scaled(new_state.velocities, dt, acceleration)
+        return new_state
+
+    def semi_implicit_euler(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        acceleration = self.accelerations(state, force)
+        new_state = self.target(state, out, state.time + dt)
+        self.axpy(new_state.velocities, state.velocities, dt, acceleration)
+        self.axpy(new_state.positions, state.positions, dt, new_state.velocities)
+        return new_state
+
+    def midpoint(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        acceleration = self.accelerations(state, force)
+        mid_state = self.stage(state, 0, state.time + dt * 0.5)
+        self.axpy(mid_state.velocities, state.velocities, dt * 0.5, acceleration)
+        self.axpy(mid_state.positions, state.positions, dt * 0.5, mid_state.velocities)
+        acceleration_mid = self.accelerations(mid_state, force)
+        new_state = self.target(state, out, state.time + dt)
+        self.axpy(new_state.velocities, state.velocities, dt, acceleration_mid)
+        self.axpy(new_state.positions, state.positions, dt, new_state.velocities)
+        return new_state
+
+    def rk4(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        acceleration = self.accelerations(state, force)
+        previous = state
+        velocities = [state.velocities]
+        accelerations = [acceleration]
+        for k, scale in enumerate([0.5, 0.5, 1.0]):
+            stage = self.stage(state, k, state.time + scale * dt)
+            self.axpy(stage.positions, state.positions, scale * dt, previous.velocities)
+            self.axpy(stage.velocities, state.velocities, scale * dt, acceleration)
+            acceleration = self.accelerations(stage, force)
+            velocities.append(stage.velocities)
+            accelerations.append(acceleration)
+            previous = stage
+        new_state = self.target(state, out, state.time + dt)
+        for result, initial, slopes in [(new_state.positions, state.positions, velocities),
+                                        (new_state.velocities, state.velocities, accelerations)]:
+            np.add(slopes[1], slopes[2], out = result)
+            result *= 2
+            result += slopes[0]
+            result += slopes[3]
+            result *= dt / 6
+            result += initial
+        return new_state
+
+    def verlet(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
         # Not included in report due to time constrains
-        position = particle.get_position() + particle.get_velocity() * dt
-        test_particle = Particle(position, particle.get_velocity(), particle.get_mass())
-        test_particle_force = force.calculate(test_particle, state)
-        particle_force = force.calculate(particle, state)
-        acceleration = (test_particle_force + particle_force) / (dt * 2)
-        velocity = particle.get_velocity() + acceleration * dt
-        position = particle.get_position() + particle.get_velocity() * dt + (particle_force / 2 * particle.get_mass()) * (dt ** 2) 
-        return Particle(position, velocity, particle.get_mass())
+        acceleration = self.first_acceleration(state, force)
+        new_state = self.target(state, out, state.time + dt)
+        self.axpy(new_state.positions, state.positions, dt, state.velocities)
+        self.add_scaled(new_state.positions, 0.5 * dt * dt, acceleration)
+        self.axpy(new_state.velocities, state.velocities, 0.5 * dt, acceleration)
+        test_acceleration = self.accelerations(new_state, force)
+        self.add_scaled(new_state.velocities, 0.5 * dt, test_acceleration)
+        self.cache_acceleration(new_state, test_acceleration)
+        return new_state
+
+    def leapfrog(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        return self.splitting(state, force, dt, out, *self.composition([1.0]))
+
+    def yoshida4(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        return self.splitting(state, force, dt, out, *self.composition(self.yoshida4_weights))
+
+    def yoshida6(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        return self.splitting(state, force, dt, out, *self.composition(self.yoshida6_weights))
+
+    def forest_ruth(self, state, force, dt, out = None):
+        """Input (ArrayState), (Force), timestep (float) return next (ArrayState)"""
+        theta = self.yoshida4_weights[0]
+        return self.splitting(state, force, dt, out, [theta / 2, (1 - theta) / 2, (1 - theta) / 2, theta / 2],
+                              [theta, 1 - 2 * theta, theta, 0])
+
+    def composition(self, weights):
+        """
+        Returns the drift (list <float>) and kick (list <float>) coefficients of kick-drift-kick leapfrog
+        substeps with some weights (list <float>), the touching half kicks of neighbouring substeps are merged
+        """
+        drifts = [0.0] + list(weights)
+        kicks = [weights[0] / 2] + [(first + second) / 2 for first, second in zip(weights, weights[1:])]
+        kicks.append(weights[-1] / 2)
+        return drifts, kicks
+
+    def splitting(self, state, force, dt, out, drifts, kicks):
+        """
+        Advances an (ArrayState) by a timestep (float) with a symplectic splitting, written into an output (ArrayState) if given.
+        Each stage drifts the positions by drifts[i] * dt then kicks the velocities by kicks[i] * dt, and the
+        accelerations are only evaluated when the positions have moved since the last kick. The accelerations at the
+        end of a step are cached so a kick-drift-kick method costs one force evaluation per drift.
+        """
+        new_state = self.target(state, out, state.time + dt)
+        new_state.positions[:] = state.positions
+        new_state.velocities[:] = state.velocities
+        acceleration = None
+        moved = False
+        for drift, kick in zip(drifts, kicks):
+            if drift != 0:
+                self.add_scaled(new_state.positions, drift * dt, new_state.velocities)
+                acceleration = None
+                moved = True
+            if kick != 0:
+                if acceleration is None and moved:
+                    acceleration = self.accelerations(new_state, force)
+                elif acceleration is None:
+                    acceleration = self.first_acceleration(state, force)
+                self.add_scaled(new_state.velocities, kick * dt, acceleration)
+        if acceleration is not None:
+            self.cache_acceleration(new_state, acceleration)
+        return new_state
+
+    def cache_acceleration(self, state, acceleration):
+        """Stores the (N,3) accelerations (ndarray) of an (ArrayState) so the next step starting from it reuses them"""
+        self.fsal = (state.positions.copy(), state.velocities.copy(), state.masses, acceleration)
+
+    def dormand_prince(self, state, force, dt, out = None):
+        """
+        Input (ArrayState), (Force), timestep (float) return next (ArrayState).
+        Advances by dt in as many Dormand-Prince 5(4) steps as the tolerances need, a step whose embedded
+        error estimate is too large is rejected and retried, and a PI controller picks the next step size.
+        The last stage of a step is the first stage of the next, so an accepted step costs six force evaluations.
+        """
+        end_time = state.time + dt
+        time = state.time
+        positions = state.positions.copy()
+        velocities = state.velocities.copy()
+        acceleration = self.first_acceleration(state, force)
+        if self.step_size is None:
+            self.step_size = self.initial_step(state, force, acceleration)
+        slopes_x = [None] * 7
+        slopes_v = [None] * 7
+        rejected = False
+        while time < end_time:
+            last = self.step_size >= end_time - time
+            h = end_time - time if last else self.step_size
+            if h <= 1e-14 * max(abs(time), abs(dt)):
+                raise RuntimeError("Adaptive step size underflow at time " + str(time))
+            slopes_x[0] = velocities
+            slopes_v[0] = acceleration
+            for i, row in enumerate(self.dormand_prince_matrix, start = 1):
+                stage = self.stage(state, i - 1, time + self.dormand_prince_nodes[i] * h)
+                stage.positions[:] = positions
+                stage.velocities[:] = velocities
+                for j, coefficient in enumerate(row):
+                    if coefficient != 0:
+                        stage.positions += (h * coefficient) * slopes_x[j]
+                        stage.velocities += (h * coefficient) * slopes_v[j]
+                slopes_x[i] = stage.velocities
+                slopes_v[i] = self.accelerations(stage, force)
+            new_positions = stage.positions
+            new_velocities = stage.velocities
+            ratio = self.error_ratio(positions, velocities, new_positions, new_velocities, slopes_x, slopes_v, h)
+            growth = ratio ** (0.2 - 0.75 * self.controller_beta)
+            if ratio <= 1:
+                factor = growth / self.previous_error ** self.controller_beta / self.safety
+                factor = min(max(factor, 1 / self.max_growth), 1 / self.min_shrink)
+                if rejected:
+                    factor = max(factor, 1.0)
+                proposal = h / factor
+                self.step_size = max(proposal, self.step_size) if last else proposal
+                self.previous_error = max(ratio, 1e-4)
+                self.accepted_steps += 1
+                time = end_time if last else time + h
+                positions[:] = new_positions
+                velocities[:] = new_velocities
+                acceleration = slopes_v[6]
+                rejected = False
+            else:
+                self.step_size = h / min(1 / self.min_shrink, growth / self.safety)
+                self.rejected_steps += 1
+                rejected = True
+        self.fsal = (positions, velocities, state.masses, acceleration)
+        new_state = self.target(state, out, end_time)
+        new_state.positions[:] = positions
+        new_state.velocities[:] = velocities
+        return new_state
+
+    def first_acceleration(self, state, force):
+        """Returns the (N,3) accelerations (ndarray) of an (ArrayState), reusing the accelerations cached by the previous step if it ended there"""
+        acceleration = self.cached(self.fsal, state)
+        if acceleration is None:
+            acceleration = self.accelerations(state, force)
+        return acceleration
+
+    def cached(self, cache, state):
+        """Returns the accelerations (ndarray) of a cache (tuple) of positions, velocities, masses and accelerations if it matches an (ArrayState), else None"""
+        if cache is None:
+            return None
+        positions, velocities, masses, acceleration = cache
+        if (positions.shape == state.positions.shape and np.array_equal(positions, state.positions)
+                and np.array_equal(velocities, state.velocities) and np.array_equal(masses, state.masses)):
+            return acceleration
+        return None
+
+    def wisdom_holman(self, state, force, dt, out = None):
+        """
+        Input (ArrayState), (Force), timestep (float) return next (ArrayState).
+        Wisdom-Holman mapping in democratic heliocentric coordinates for a system dominated by its heaviest particle.
+        Each planet drifts exactly along its Kepler orbit about the central mass, between half kicks from the
+        planet-planet forces of the (Force) and half steps of the central mass recoil.
+        The planet-planet accelerations at the end of a step are reused by the next one.
+        """
+        masses = state.masses
+        central = int(np.argmax(masses))
+        planets = np.arange(len(masses)) != central
+        planet_masses = masses[planets]
+        total_mass = masses.sum()
+        central_mass = masses[central]
+        centre = masses @ state.positions / total_mass
+        centre_velocity = masses @ state.velocities / total_mass
+        heliocentric = state.positions[planets] - state.positions[central]
+        barycentric = state.velocities[planets] - centre_velocity
+        acceleration = self.cached(self.interaction_cache, state)
+        if acceleration is None:
+            acceleration = self.accelerations(ArrayState(heliocentric, barycentric, planet_masses, state.time), force)
+        if len(planet_masses):
+            barycentric += (0.5 * dt) * acceleration
+            heliocentric += (0.5 * dt / central_mass) * (planet_masses @ barycentric)
+            heliocentric, barycentric = propagate(heliocentric, barycentric, G * central_mass, dt)
+            heliocentric += (0.5 * dt / central_mass) * (planet_masses @ barycentric)
+            planet_state = ArrayState(heliocentric, barycentric, planet_masses, state.time + dt)
+            acceleration = self.accelerations(planet_state, force)
+            barycentric += (0.5 * dt) * acceleration
+        centre += dt * centre_velocity
+        new_state = self.target(state, out, state.time + dt)
+        new_state.positions[central] = centre - planet_masses @ heliocentric / total_mass
+        new_state.positions[planets] = heliocentric + new_state.positions[central]
+        new_state.velocities[central] = centre_velocity - planet_masses @ barycentric / central_mass
+        new_state.velocities[planets] = barycentric + centre_velocity
+        self.interaction_cache = (new_state.positions.copy(), new_state.velocities.copy(), masses, acceleration)
+        return new_state
+
+    def error_ratio(self, positions, velocities, new_positions, new_velocities, slopes_x, slopes_v, h):
+        """
+        Returns the root mean square of the embedded error estimate over the tolerance (float), below 1 accepts the step,
+        the largest over the members of an ensemble
+        """
+        total = 0.0
+        for old, new, slopes in [(positions, new_positions, slopes_x), (velocities, new_velocities, slopes_v)]:
+            error = np.zeros_like(old)
+            for coefficient, slope in zip(self.dormand_prince_error, slopes):
+                if coefficient != 0:
+                    error += (h * coefficient) * slope
+            scale = self.atol + self.rtol * np.maximum(np.abs(old), np.abs(new))
+            total = total + np.mean((error / scale) ** 2, axis = (-2, -1))
+        return sqrt(np.max(total) / 2)
+
+    def initial_step(self, state, force, acceleration):
+        """Returns a first adaptive step size (float) for an (ArrayState) from its accelerations (ndarray), costing one force evaluation"""
+        values = np.concatenate([state.positions, state.velocities])
+        slopes = np.concatenate([state.velocities, acceleration])
+        scale = self.atol + self.rtol * np.abs(values)
+        d0 = sqrt(np.mean((values / scale) ** 2))
+        d1 = sqrt(np.mean((slopes / scale) ** 2))
+        h0 = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+        stage = self.stage(state, 0, state.time + h0)
+        self.axpy(stage.positions, state.positions, h0, state.velocities)
+        self.axpy(stage.velocities, state.velocities, h0, acceleration)
+        new_slopes = np.concatenate([stage.velocities, self.accelerations(stage, force)])
+        d2 = sqrt(np.mean(((new_slopes - slopes) / scale) ** 2)) / h0
+        if max(d1, d2) <= 1e-15:
+            h1 = max(1e-6, h0 * 1e-3)
+        else:
+            h1 = (0.01 / max(d1, d2)) ** 0.2
+        return min(100 * h0, h1)
+
+    def block_timestep(self, state, force, dt, out = None):
+        """
+        Input (ArrayState), (Force), timestep (float) return next (ArrayState).
+        Advances by dt with individual power-of-two block timesteps dt / 2^level and a fourth order Hermite
+        predictor-corrector. Each particle picks the largest block step below block_eta * |a| / |jerk|,
+        and each substep only evaluates the forces on the particles whose step ends, every other particle
+        is predicted from its Taylor series. The active particles per level are counted in active_per_level.
+        """
+        levels_count = self.block_levels
+        total = 1 << levels_count
+        unit = dt / total
+        masses = state.masses
+        positions = state.positions.copy()
+        velocities = state.velocities.copy()
+        cached = self.block_cache is not None and self.block_cache[0].shape == positions.shape
+        if cached:
+            cache_positions, cache_velocities, cache_masses, accelerations, jerks, levels = self.block_cache
+            cached = (np.array_equal(cache_positions, positions) and np.array_equal(cache_velocities, velocities)
+                      and np.array_equal(cache_masses, masses))
+        if not cached:
+            forces, force_jerks = force.calculate_active(state, np.arange(len(masses)))
+            accelerations = forces / masses[:, None]
+            jerks = force_jerks / masses[:, None]
+            levels = self.block_level(accelerations, jerks, dt)
+        else:
+            accelerations = accelerations.copy()
+            jerks = jerks.copy()
+            levels = levels.copy()
+        ticks = np.zeros(len(masses), dtype = np.int64)
+        stage = self.stage(state, 0, state.time)
+        while ticks.min() < total:
+            ends = ticks + (np.int64(1) << (levels_count - levels))
+            tick = ends.min()
+            active = np.nonzero(ends == tick)[0]
+            delta = ((tick - ticks) * unit)[:, None]
+            stage.time = state.time + tick * unit
+            stage.positions[:] = positions + delta * (velocities + delta * (accelerations / 2 + delta * jerks / 6))
+            stage.velocities[:] = velocities + delta * (accelerations + delta * jerks / 2)
+            forces, force_jerks = force.calculate_active(stage, active)
+            new_accelerations = forces / masses[active, None]
+            new_jerks = force_jerks / masses[active, None]
+            h = delta[active]
+            new_velocities = (velocities[active] + h / 2 * (accelerations[active] + new_accelerations)
+                              + h * h / 12 * (jerks[active] - new_jerks))
+            positions[active] = (positions[active] + h / 2 * (velocities[active] + new_velocities)
+                                 + h * h / 12 * (accelerations[active] - new_accelerations))
+            velocities[active] = new_velocities
+            accelerations[active] = new_accelerations
+            jerks[active] = new_jerks
+            ticks[active] = tick
+            self.active_per_level += np.bincount(levels[active], minlength = levels_count + 1)
+            self.accepted_steps += 1
+            wanted = self.block_level(new_accelerations, new_jerks, dt)
+            old = levels[active]
+            aligned = tick % (np.int64(1) << (levels_count - old + 1)) == 0
+            levels[active] = np.where(wanted > old, wanted, np.where((wanted < old) & aligned, old - 1, old))
+        self.block_cache = (positions, velocities, masses, accelerations, jerks, levels)
+        new_state = self.target(state, out, state.time + dt)
+        new_state.positions[:] = positions
+        new_state.velocities[:] = velocities
+        return new_state
+
+    def block_level(self, accelerations, jerks, dt):
+        """Returns the (N,) block levels (ndarray) whose steps dt / 2^level are below block_eta * |a| / |jerk| for the (N,3) accelerations and jerks"""
+        acceleration = np.linalg.norm(accelerations, axis = 1)
+        jerk = np.linalg.norm(jerks, axis = 1)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            ratio = dt * jerk / (self.block_eta * acceleration)
+            levels = np.ceil(np.log2(np.where(jerk > 0, ratio, 1.0)))
+        levels = np.nan_to_num(levels, nan = self.block_levels, posinf = self.block_levels)
+        return np.clip(levels, 0, self.block_levels).astype(np.int64)
+
+    def gauss_radau(self, state, force, dt, out = None):
+        """
+        Input (ArrayState), (Force), timestep (float) return next (ArrayState).
+        Fifteenth order implicit Runge-Kutta method in the style of IAS15. The accelerations over a step are a
+        degree seven polynomial fitted at the Gauss-Radau nodes by predictor-corrector iteration, warm started
+        from the previous step. The step size makes the last polynomial coefficient about epsilon of the
+        accelerations, a step whose size would shrink below radau_safety of itself is rejected, and positions
+        and velocities are accumulated with compensated summation. Like dormand_prince, a RuntimeError is
+        raised if the step size underflows or becomes NaN.
+        """
+        end_time = state.time + dt
+        time = state.time
+        positions = state.positions.copy()
+        velocities = state.velocities.copy()
+        position_error = np.zeros_like(positions)
+        velocity_error = np.zeros_like(velocities)
+        if self.radau_step is None:
+            self.radau_step = dt
+        if self.radau_b is None or self.radau_b.shape[1:] != positions.shape:
+            self.radau_b = np.zeros((7,) + positions.shape)
+        stage = self.stage(state, 0, time)
+        acceleration = None
+        while time < end_time:
+            last = self.radau_step >= end_time - time
+            h = end_time - time if last else self.radau_step
+            if not h > 1e-14 * max(abs(time), abs(dt)):
+                raise RuntimeError("Adaptive step size underflow at time " + str(time))
+            stage.positions[:] = positions
+            stage.velocities[:] = velocities
+            stage.time = time
+            if acceleration is None:
+                acceleration = self.accelerations(stage, force)
+            coefficients = np.empty((8,) + positions.shape)
+            coefficients[0] = acceleration
+            b = self.radau_b
+            g = np.einsum('ij,j...->i...', self.radau_to_newton, b)
+            previous_error = np.inf
+            for iteration in range(self.radau_iterations):
+                old_b6 = b[6].copy()
+                for n, node in enumerate(self.radau_nodes):
+                    coefficients[1:] = b
+                    stage.time = time + node * h
+                    stage.positions[:] = positions + node * h * velocities + h * h * np.tensordot(
+                        self.radau_position_weights[n], coefficients, axes = 1)
+                    stage.velocities[:] = velocities + h * np.tensordot(self.radau_velocity_weights[n], coefficients, axes = 1)
+                    difference = (self.accelerations(stage, force) - coefficients[0]) / node
+                    for j in range(n):
+                        difference = (difference - g[j]) / (node - self.radau_nodes[j])
+                    g[n] = difference
+                    b = np.einsum('ij,j...->i...', self.radau_to_monomial, g)
+                error = self.relative_size(b[6] - old_b6, coefficients[0])
+                if error < 1e-16 or (iteration > 1 and error >= previous_error):
+                    break
+                previous_error = error
+            error = self.relative_size(b[6], coefficients[0])
+            proposal = h * (self.epsilon / error) ** (1 / 7) if error > 0 else h / self.radau_safety
+            if not proposal >= self.radau_safety * h:
+                self.radau_b = b * ((proposal / h) ** np.arange(1, 8)).reshape((7,) + (1,) * positions.ndim)
+                self.radau_step = proposal
+                self.rejected_steps += 1
+                continue
+            coefficients[1:] = b
+            self.compensated_add(positions, position_error, h * velocities + h * h * np.tensordot(
+                self.radau_position_weights[7], coefficients, axes = 1))
+            self.compensated_add(velocities, velocity_error, h * np.tensordot(
+                self.radau_velocity_weights[7], coefficients, axes = 1))
+            time = end_time if last else time + h
+            acceleration = None
+            proposal = min(proposal, h / self.radau_safety)
+            self.radau_step = max(proposal, self.radau_step) if last else proposal
+            self.radau_b = np.einsum('ij,j...->i...', self.radau_prediction * (proposal / h) ** np.arange(1, 8)[:, None], b)
+            self.accepted_steps += 1
+        new_state = self.target(state, out, end_time)
+        new_state.positions[:] = positions
+        new_state.velocities[:] = velocities
+        return new_state
+
+    def kepler(self, state, force, dt, out = None):
+        """
+        Input (ArrayState), (Force), timestep (float) return next (ArrayState).
+        Moves every particle along its exact two-body orbit about the heaviest particle, ignoring the force and
+        the interactions between the other particles, so any timestep is exact for two bodies. The barycentre
+        moves in a straight line and the heaviest particle recoils from the others.
+        """
+        masses = state.masses
+        central = int(np.argmax(masses))
+        others = np.arange(len(masses)) != central
+        other_masses = masses[others]
+        total_mass = masses.sum()
+        centre = masses @ state.positions / total_mass + dt * (masses @ state.velocities / total_mass)
+        centre_velocity = masses @ state.velocities / total_mass
+        positions, velocities = propagate(state.positions[others] - state.positions[central],
+                                          state.velocities[others] - state.velocities[central],
+                                          G * (masses[central] + other_masses), dt)
+        new_state = self.target(state, out, state.time + dt)
+        new_state.positions[central] = centre - other_masses @ positions / total_mass
+        new_state.positions[others] = positions + new_state.positions[central]
+        new_state.velocities[central] = centre_velocity - other_masses @ velocities / total_mass
+        new_state.velocities[others] = velocities + new_state.velocities[central]
+        return new_state
+
+    def bulirsch_stoer(self, state, force, dt, out = None):
+        """
+        Input (ArrayState), (Force), timestep (float) return next (ArrayState).
+        Advances by dt in Bulirsch-Stoer steps. Each step runs the modified midpoint method with more and more
+        substeps and extrapolates the results to zero substep size, until the change from the last extrapolation
+        is within the tolerances. The number of extrapolation columns and the step size are chosen to minimise
+        the force evaluations per unit time, and the columns used by each step are counted in extrapolation_depths.
+        Like dormand_prince, a RuntimeError is raised if the step size underflows or becomes NaN.
+        """
+        end_time = state.time + dt
+        time = state.time
+        positions = state.positions.copy()
+        velocities = state.velocities.copy()
+        if self.extrapolation_step is None:
+            self.extrapolation_step = dt
+        sequence = self.extrapolation_sequence
+        work = np.cumsum([1] + sequence)[1:]
+        stage = self.stage(state, 0, time)
+        acceleration = None
+        while time < end_time:
+            last = self.extrapolation_step >= end_time - time
+            h = end_time - time if last else self.extrapolation_step
+            if not h > 1e-14 * max(abs(time), abs(dt)):
+                raise RuntimeError("Adaptive step size underflow at time " + str(time))
+            if acceleration is None:
+                stage.positions[:] = positions
+                stage.velocities[:] = velocities
+                stage.time = time
+                acceleration = self.accelerations(stage, force)
+            target = self.extrapolation_columns
+            table = []
+            step_sizes = {}
+            accepted = None
+            for k in range(min(target + 2, len(sequence))):
+                row = [self.modified_midpoint(stage, force, positions, velocities, acceleration, time, h, sequence[k])]
+                for j in range(1, k + 1):
+                    factor = (sequence[k] / sequence[k - j]) ** 2 - 1
+                    row.append(tuple(new + (new - old) / factor for new, old in zip(row[j - 1], table[k - 1][j - 1])))
+                table.append(row)
+                if k == 0:
+                    continue
+                error = self.extrapolation_error(positions, velocities, row[k], row[k - 1])
+                growth = 0.94 * (0.65 / error) ** (1 / (2 * k + 1)) if error != 0 else 4.0
+                step_sizes[k] = h * min(max(growth, 0.02), 4.0)
+                if error <= 1 and k >= target - 1:
+                    accepted = k
+                    break
+            if accepted is None:
+                self.extrapolation_step = step_sizes[min(target, max(step_sizes))]
+                self.rejected_steps += 1
+                continue
+            positions, velocities = table[accepted][accepted]
+            time = end_time if last else time + h
+            acceleration = None
+            self.accepted_steps += 1
+            self.extrapolation_depths[accepted + 1] += 1
+            cost = {k: work[k] / step_sizes[k] for k in step_sizes}
+            if accepted > 1 and cost[accepted - 1] < 0.8 * cost[accepted]:
+                target = accepted - 1
+                proposal = step_sizes[accepted - 1]
+            elif accepted + 1 < len(sequence) - 1 and cost[accepted] < 0.9 * cost.get(accepted - 1, np.inf):
+                target = accepted + 1
+                proposal = step_sizes[accepted] * work[accepted + 1] / work[accepted]
+            else:
+                target = accepted
+                proposal = step_sizes[accepted]
+            self.extrapolation_columns = min(max(target, 2), len(sequence) - 2)
+            self.extrapolation_step = max(proposal, self.extrapolation_step) if last else proposal
+        new_state = self.target(state, out, end_time)
+        new_state.positions[:] = positions
+        new_state.velocities[:] = velocities
+        return new_state
+
+    def modified_midpoint(self, stage, force, positions, velocities, acceleration, time, h, substeps):
+        """
+        Returns the positions (ndarray) and velocities (ndarray) after a step of size h (float) made of some
+        number of substeps (int) of the modified midpoint method, starting from the accelerations (ndarray) at
+        some positions (ndarray) and velocities (ndarray), using a stage (ArrayState) for the force evaluations
+        """
+        small = h / substeps
+        old_positions = positions
+        old_velocities = velocities
+        new_positions = positions + small * velocities
+        new_velocities = velocities + small * acceleration
+        for m in range(1, substeps + 1):
+            stage.positions[:] = new_positions
+            stage.velocities[:] = new_velocities
+            stage.time = time + m * small
+            acceleration = self.accelerations(stage, force)
+            if m == substeps:
+                break
+            old_positions, new_positions = new_positions, old_positions + (2 * small) * new_velocities
+            old_velocities, new_velocities = new_velocities, old_velocities + (2 * small) * acceleration
+        return ((new_positions + old_positions + small * new_velocities) / 2,
+                (new_velocities + old_velocities + small * acceleration) / 2)
+
+    def extrapolation_error(self, positions, velocities, estimate, previous):
+        """
+        Returns the root mean square difference of two extrapolated (tuple) positions and velocities over the tolerance (float),
+        the largest over the members of an ensemble
+        """
+        total = 0.0
+        for old, new, other in zip([positions, velocities], estimate, previous):
+            scale = self.atol + self.rtol * np.maximum(np.abs(old), np.abs(new))
+            total = total + np.mean(((new - other) / scale) ** 2, axis = (-2, -1))
+        return sqrt(np.max(total) / 2)
+
+    def relative_size(self, values, reference):
+        """Returns the largest of some values (ndarray) over the largest of a reference (ndarray) (float), the largest over the members of an ensemble"""
+        scale = np.abs(reference).max(axis = (-2, -1))
+        size = np.abs(values).max(axis = (-2, -1))
+        return float(np.max(np.where(scale > 0, size / np.where(scale > 0, scale, 1), 0.0)))
+
+    def compensated_add(self, total, error, increment):
+        """Adds an increment (ndarray) to a total (ndarray) in place with Kahan summation, carrying the rounding error (ndarray)"""
+        if backend.active() and total.flags.c_contiguous and error.flags.c_contiguous and increment.shape == total.shape:
+            kahan_add(total.reshape(-1), error.reshape(-1), increment.reshape(-1))
+            return
+        increment = increment - error
+        result = total + increment
+        error[:] = (result - total) - increment
+        total[:] = result
+
+    def build_radau_tables(self):
+        """Builds the Gauss-Radau nodes and the tables relating the Newton and monomial forms of the acceleration polynomial"""
+        self.radau_nodes = [0.0562625605369221464656521910318, 0.180240691736892364987579942780,
+                            0.352624717113169637373907769648, 0.547153626330555383001448554766,
+                            0.734210177215410531523210605558, 0.885320946839095768090359771030,
+                            0.977520613561287501891174488626]
+        self.radau_to_monomial = np.zeros((7, 7))
+        basis = np.array([0.0, 1.0])
+        for n in range(7):
+            self.radau_to_monomial[:len(basis) - 1, n] = basis[1:]
+            basis = np.convolve(basis, [-self.radau_nodes[n], 1.0])
+        self.radau_to_newton = np.linalg.inv(self.radau_to_monomial)
+        powers = np.arange(8)
+        self.radau_velocity_weights = np.array([node ** (powers + 1) / (powers + 1) for node in self.radau_nodes + [1.0]])
+        self.radau_position_weights = np.array([node ** (powers + 2) / ((powers + 1) * (powers + 2))
+                                                for node in self.radau_nodes + [1.0]])
+        self.radau_prediction = np.array([[comb(k + 1, m + 1) for k in range(7)] for m in range(7)], dtype = np.float64)
+
+    def stage_objects(self, state, k):
+        """Returns the kth reusable intermediate (SystemState) with as many Particles as some (SystemState)"""
+        while len(self.stages) <= k:
+            self.stages.append(None)
+        stage = self.stages[k]
+        if stage is None or stage.num_particles() != state.num_particles():
+            stage = state.copy()
+            self.stages[k] = stage
+        return stage
+
+    def target_objects(self, state, out, time):
+        """Returns a (SystemState) holding a copy of some (SystemState) at some time (float), written into an output (SystemState) if given"""
+        if out is None or out.num_particles() != state.num_particles():
+            new_state = state.copy()
+            if out is not None:
+                out.particles = new_state.particles
+                new_state = out
+        else:
+            new_state = out
+            for particle, new_particle in zip(state.particles, new_state.particles):
+                new_particle.assign(particle.position, particle.velocity)
+                new_particle.mass = particle.mass
+        new_state.time = time
+        return new_state
+
+    def euler_forwards_objects(self, state, force, dt, out = None):
+        """Input (SystemState), (Force), timestep (float) return next (SystemState)"""
+        forces = force.calculate_objects(state)
+        new_state = self.target_objects(state, out, state.time + dt)
+        for particle, particle_force in zip(new_state.particles, forces):
+            particle.position.add_scaled(particle.velocity, dt)
+            particle.velocity.add_scaled(particle_force, dt / particle.mass)
+        return new_state
+
+    def euler_back_objects(self, state, force, dt, out = None):
+        """Input (SystemState), (Force), timestep (float) return next (SystemState)"""
+        new_state = self.target_objects(state, out, state.time + dt)
+        for particle in new_state.particles:
+            particle.position.add_scaled(particle.velocity, dt)
+        forces = force.calculate_objects(new_state)
+        for particle, particle_force in zip(new_state.particles, forces):
+            particle.velocity.add_scaled(particle_force, dt / particle.mass)
+        return new_state
+
+    def semi_implicit_euler_objects(self, state, force, dt, out = None):
+        """Input (SystemState), (Force), timestep (float) return next (SystemState)"""
+        forces = force.calculate_objects(state)
+        new_state = self.target_objects(state, out, state.time + dt)
+        for particle, particle_force in zip(new_state.particles, forces):
+            particle.velocity.add_scaled(particle_force, dt / particle.mass)
+            particle.position.add_scaled(particle.velocity, dt)
+        return new_state
+
+    def midpoint_objects(self, state, force, dt, out = None):
+        """Input (SystemState), (Force), timestep (float) return next (SystemState)"""
+        forces = force.calculate_objects(state)
+        mid_state = self.stage_objects(state, 0)
+        mid_state.time = state.time + dt * 0.5
+        for particle, mid_particle, particle_force in zip(state.particles, mid_state.particles, forces):
+            mid_particle.assign(particle.position, particle.velocity)
+            mid_particle.velocity.add_scaled(particle_force, dt * 0.5 / particle.mass)
+            mid_particle.position.add_scaled(mid_particle.velocity, dt * 0.5)
+        forces = force.calculate_objects(mid_state)
+        new_state = self.target_objects(state, out, state.time + dt)
+        for particle, particle_force in zip(new_state.particles, forces):
+            particle.velocity.add_scaled(particle_force, dt / particle.mass)
+            particle.position.add_scaled(particle.velocity, dt)
+        return new_state
+
+    def rk4_objects(self, state, force, dt, out = None):
+        """Input (SystemState), (Force), timestep (float) return next (SystemState)"""
+        forces = force.calculate_objects(state)
+        previous = state
+        stage_forces = [forces]
+        stages = []
+        for k, scale in enumerate([0.5, 0.5, 1.0]):
+            stage = self.stage_objects(state, k)
+            stage.time = state.time + scale * dt
+            for particle, stage_particle, previous_particle, particle_force in zip(
+                    state.particles, stage.particles, previous.particles, forces):
+                stage_particle.assign(particle.position, particle.velocity)
+                stage_particle.position.add_scaled(previous_particle.velocity, scale * dt)
+                stage_particle.velocity.add_scaled(particle_force, scale * dt / particle.mass)
+            forces = force.calculate_objects(stage)
+            stage_forces.append(forces)
+            stages.append(stage)
+            previous = stage
+        new_state = self.target_objects(state, out, state.time + dt)
+        velocity_states = [state] + stages
+        for i, particle in enumerate(new_state.particles):
+            for weight, velocity_state, forces in zip([1, 2, 2, 1], velocity_states, stage_forces):
+                particle.position.add_scaled(velocity_state.particles[i].velocity, weight * dt / 6)
+                particle.velocity.add_scaled(forces[i], weight * dt / (6 * particle.mass))
+        return new_state
+
+    def verlet_objects(self, state, force, dt, out = None):
+        """Input (SystemState), (Force), timestep (float) return next (SystemState)"""
+        forces = force.calculate_objects(state)
+        new_state = self.target_objects(state, out, state.time + dt)
+        for particle, particle_force in zip(new_state.particles, forces):
+            particle.position.add_scaled(particle.velocity, dt)
+            particle.position.add_scaled(particle_force, 0.5 * dt * dt / particle.mass)
+        test_forces = force.calculate_objects(new_state)
+        for particle, particle_force, test_force in zip(new_state.particles, forces, test_forces):
+            particle.velocity.add_scaled(particle_force, 0.5 * dt / particle.mass)
+            particle.velocity.add_scaled(test_force, 0.5 * dt / particle.mass)
+        return new_state
         
         
-    def __init__(self):
-        """Initialise a new Integrator"""
+    def __init__(self, rtol = 1e-9, atol = 1e-9, block_eta = 0.01, block_levels = 24, epsilon = 1e-9):
+        """
+        Initialise a new Integrator with the relative (float) and absolute (float) tolerances of adaptive methods,
+        the accuracy parameter (float) and most levels (int) of block timesteps and the accuracy parameter (float)
+        of the Gauss-Radau method
+        """
 
         self.integration_method = Enum([self.euler_forwards,
                                      self.euler_back,
                                      self.semi_implicit_euler,
                                      self.midpoint,
-                                     self.rk4])
+                                     self.rk4,
+                                     self.dormand_prince,
+                                     self.block_timestep,
+                                     self.verlet,
+                                     self.leapfrog,
+                                     self.yoshida4,
+                                     self.yoshida6,
+                                     self.forest_ruth,
+                                     self.wisdom_holman,
+                                     self.gauss_radau,
+                                     self.bulirsch_stoer,
+                                     self.kepler])
+        self.adaptive_methods = {'dormand_prince', 'block_timestep', 'gauss_radau', 'bulirsch_stoer'}
+        self.ensemble_methods = {'euler_forwards', 'euler_back', 'semi_implicit_euler', 'midpoint', 'rk4',
+                                 'dormand_prince', 'verlet', 'leapfrog', 'yoshida4', 'yoshida6', 'forest_ruth',
+                                 'gauss_radau', 'bulirsch_stoer'}
+        self.object_methods = {'euler_forwards': self.euler_forwards_objects,
+                               'euler_back': self.euler_back_objects,
+                               'semi_implicit_euler': self.semi_implicit_euler_objects,
+                               'midpoint': self.midpoint_objects,
+                               'rk4': self.rk4_objects,
+                               'verlet': self.verlet_objects}
+        self.stages = []
+        self.array_stages = []
+        self.rtol = rtol
+        self.atol = atol
+        self.accepted_steps = 0
+        self.rejected_steps = 0
+        self.step_size = None
+        self.previous_error = 1e-4
+        self.fsal = None
+        self.interaction_cache = None
+        self.block_eta = block_eta
+        self.block_levels = block_levels
+        self.active_per_level = np.zeros(block_levels + 1, dtype = np.int64)
+        self.block_cache = None
+        self.epsilon = epsilon
+        self.radau_step = None
+        self.radau_b = None
+        self.build_radau_tables()
+        self.extrapolation_step = None
+        self.extrapolation_columns = 3
+        self.extrapolation_depths = np.zeros(len(self.extrapolation_sequence) + 1, dtype = np.int64)
+        self.particle_cache = None
 
-    def integrate(self, state, particle, force, dt):
-        """Computes the integration for some (Particle), (SystemState), (Force), timestep (float) returning a Particle"""
+    def integrate(self, state, force, dt, out = None):
+        """
+        Computes the integration for some (SystemState) or (ArrayState), (Force), timestep (float) returning the next state.
+        If an output state of the same type is given the result is written into it and it is returned.
+        The single particle form integrate(state, particle, force, dt) returns the next (Particle) of a
+        particle of the state, as integrate_particle.
+        """
+        if isinstance(force, Particle):
+            return self.integrate_particle(state, force, dt, out)
         func = self.integration_method.get_state()
-        out = func(particle, state, force, dt) 
-        return out
+        if func.__name__ not in self.adaptive_methods:
+            self.accepted_steps += 1
+        if isinstance(state, EnsembleState) and func.__name__ not in self.ensemble_methods:
+            new_state = self.target(state, out, state.time + dt)
+            for member, new_member in zip(state.members(), new_state.members()):
+                func(member, force, dt).copy(new_member)
+            return new_state
+        if isinstance(state, ArrayState):
+            return func(state, force, dt, out)
+        object_func = self.object_methods.get(func.__name__)
+        if object_func is not None:
+            return object_func(state, force, dt, out)
+        new_state = func(ArrayState.from_state(state), force, dt)
+        return new_state.to_state(out)
+
+    def integrate_particle(self, state, particle, force, dt):
+        """
+        Returns the next (Particle) of a (Particle) belonging to some (SystemState) or (ArrayState) after a step
+        with some (Force) and timestep (float). The stepped system is kept until a different state, time, method,
+        force or timestep is asked for, so stepping every particle of an unchanged state costs one system step.
+        """
+        settings = (state.get_time(), self.integration_method.get_state().__name__, dt)
+        cached = self.particle_cache
+        if cached is None or cached[0] is not state or cached[1] is not force or cached[2] != settings:
+            indices = {id(item): i for i, item in enumerate(state.get_particles())}
+            cached = (state, force, settings, self.integrate(state, force, dt), indices)
+            self.particle_cache = cached
+        index = cached[4].get(id(particle))
+        if index is None:
+            index = state.get_particles().index(particle)
+        return cached[3].get_particle(index).copy()
+
+    def get_auxiliary(self):
+        """Returns the integrator data (dict <str, ndarray>) carried between steps, which a checkpoint must store"""
+        auxiliary = {}
+        if self.step_size is not None:
+            auxiliary['step_size'] = np.array(self.step_size)
+            auxiliary['previous_error'] = np.array(self.previous_error)
+        if self.fsal is not None:
+            for name, value in zip(['positions', 'velocities', 'masses', 'acceleration'], self.fsal):
+                auxiliary['fsal_' + name] = value
+        if self.block_cache is not None:
+            for name, value in zip(self.block_names, self.block_cache):
+                auxiliary['block_' + name] = value
+        if self.interaction_cache is not None:
+            for name, value in zip(['positions', 'velocities', 'masses', 'acceleration'], self.interaction_cache):
+                auxiliary['interaction_' + name] = value
+        if self.radau_step is not None:
+            auxiliary['radau_step'] = np.array(self.radau_step)
+            auxiliary['radau_b'] = self.radau_b
+        if self.extrapolation_step is not None:
+            auxiliary['extrapolation_step'] = np.array(self.extrapolation_step)
+            auxiliary['extrapolation_columns'] = np.array(self.extrapolation_columns)
+        return auxiliary
+
+    def set_auxiliary(self, auxiliary):
+        """Restores the integrator data (dict <str, ndarray>) carried between steps from a checkpoint"""
+        self.step_size = None
+        self.previous_error = 1e-4
+        self.fsal = None
+        if 'step_size' in auxiliary:
+            self.step_size = float(auxiliary['step_size'])
+            self.previous_error = float(auxiliary['previous_error'])
+        if 'fsal_acceleration' in auxiliary:
+            self.fsal = tuple(np.array(auxiliary['fsal_' + name]) for name in
+                              ['positions', 'velocities', 'masses', 'acceleration'])
+        self.block_cache = None
+        if 'block_levels' in auxiliary:
+            self.block_cache = tuple(np.array(auxiliary['block_' + name]) for name in self.block_names)
+        self.extrapolation_step = None
+        self.extrapolation_columns = 3
+        if 'extrapolation_step' in auxiliary:
+            self.extrapolation_step = float(auxiliary['extrapolation_step'])
+            self.extrapolation_columns = int(auxiliary['extrapolation_columns'])
+        self.radau_step = None
+        self.radau_b = None
+        if 'radau_step' in auxiliary:
+            self.radau_step = float(auxiliary['radau_step'])
+            self.radau_b = np.array(auxiliary['radau_b'])
+        self.interaction_cache = None
+        if 'interaction_acceleration' in auxiliary:
+            self.interaction_cache = tuple(np.array(auxiliary['interaction_' + name]) for name in
+                                           ['positions', 'velocities', 'masses', 'acceleration'])
+
+    def get_settings(self):
+        """Returns the name of the method in use and its parameters (dict)"""
+        return {'name': str(self), 'rtol': self.rtol, 'atol': self.atol, 'block_eta': self.block_eta,
+                'block_levels': self.block_levels, 'epsilon': self.epsilon}
+
+    def set_settings(self, settings):
+        """Switches to the method and parameters (dict) returned by get_settings"""
+        for name, value in settings.items():
+            if name != 'name':
+                setattr(self, name, value)
+        if len(self.active_per_level) != self.block_levels + 1:
+            self.active_per_level = np.zeros(self.block_levels + 1, dtype = np.int64)
+        self.switch(settings['name'])
+
+    def get_statistics(self):
+        """
+        Returns the accepted and rejected step counts, the block timestep particle steps per level and
+        the number of Bulirsch-Stoer steps using each number of extrapolation columns (dict)
+        """
+        levels = np.nonzero(self.active_per_level)[0]
+        active_per_level = self.active_per_level[:levels[-1] + 1].tolist() if len(levels) else []
+        columns = np.nonzero(self.extrapolation_depths)[0]
+        extrapolation_depths = self.extrapolation_depths[:columns[-1] + 1].tolist() if len(columns) else []
+        return {'accepted_steps': self.accepted_steps, 'rejected_steps': self.rejected_steps,
+                'active_per_level': active_per_level, 'extrapolation_depths': extrapolation_depths}
+
+    def reset_statistics(self):
+        """Resets the step counts"""
+        self.accepted_steps = 0
+        self.rejected_steps = 0
+        self.active_per_level[:] = 0
+        self.extrapolation_depths[:] = 0
 
     def switch(self, string):
         """Switch to a different integration method (str)"""
@@ -357,34 +1911,158 @@ class Integrator:
         return self.integration_method.get_state().__name__
 
 
+class History:
+    """
+    Policy deciding which states a System keeps.
+    Attributes:
+        mode (str): 'all' keeps every state, 'last' keeps the last size states in a ring buffer and
+            'every' keeps every size-th state, with the latest state always available.
+        size (int): The ring buffer length for 'last' or the decimation for 'every'.
+        count (int): How many states have been added.
+    """
+
+    def __init__(self, mode = 'all', size = 1):
+        """Initialises a History with some mode (str) and size (int)"""
+        if mode not in ('all', 'last', 'every'):
+            raise ValueError("Unknown history mode " + str(mode))
+        if size < 1:
+            raise ValueError("History size must be at least 1")
+        self.mode = mode
+        self.size = size
+        self.count = 0
+        self.latest = None
+        self.latest_kept = False
+        if mode == 'last':
+            self.states = deque(maxlen = size)
+        else:
+            self.states = []
+
+    def keeps(self, index):
+        """Returns whether the state with some index (int) is kept (bool)"""
+        return self.mode != 'every' or index % self.size == 0
+
+    def add(self, state, copy = False):
+        """
+        Adds the next (SystemState), storing a copy of it if copy (bool) and it is kept.
+        A full ring buffer copies into the state it evicts, so it allocates nothing once full.
+        """
+        self.latest_kept = self.keeps(self.count)
+        if self.latest_kept and copy:
+            if self.mode == 'last' and len(self.states) == self.size:
+                state = state.copy(self.states[0])
+            else:
+                state = state.copy()
+        if self.latest_kept:
+            self.states.append(state)
+        self.latest = state
+        self.count += 1
+
+    def get_states(self):
+        """Returns the kept states and the latest state in time order (list <SystemState>)"""
+        if self.latest_kept:
+            return list(self.states)
+        return list(self.states) + [self.latest]
+
+    def get_state(self, i):
+        """Returns the (SystemState) with some index into get_states"""
+        if i == -1:
+            return self.latest
+        if self.mode == 'all':
+            return self.states[i]
+        return self.get_states()[i]
+
+    def __len__(self):
+        """Returns the number of states available (int)"""
+        return len(self.states) + (0 if self.latest_kept else 1)
+
+
 class System:
 
-    def __init__(self, init_state, integrator, force, dt):
-        """initialises a System with initaial (SystemState), (Integrator), (Force) and timestep (float)"""
+    def __init__(self, init_state, integrator, force, dt, buffered = False, history = None, writer = None,
+                 checkpointer = None):
+        """
+        initialises a System with initaial (SystemState), (Integrator), (Force) and timestep (float).
+        If buffered (bool) the System owns two preallocated copies of the initial state and the integrator
+        writes each step into the back one before they are swapped, so no states are allocated while stepping.
+        Kept states are then stored as copies and only the latest state is kept by default.
+        The (History) decides which states are kept, all of them by default when not buffered.
+        If a (TrajectoryWriter) is given every state is also streamed to disk, and if a (Checkpointer)
+        is given it is called after every step.
+        """
         
-        self.states = [init_state]
+        if history is None:
+            history = History('last', 1) if buffered else History()
+        self.history = history
+        self.writer = writer
+        self.checkpointer = checkpointer
         self.integrator = integrator
         self.force = force
         self.dt = dt
+        self.buffers = None
+        if buffered:
+            self.buffers = [init_state.copy(), init_state.copy()]
+            self.record(self.buffers[0])
+        else:
+            self.record(init_state)
+
+    def record(self, state):
+        """Adds a new (SystemState) to the history and the trajectory writer"""
+        self.history.add(state, copy = self.buffers is not None)
+        if self.writer is not None:
+            self.writer.write(state)
+
+    @property
+    def states(self):
+        """The states (list <SystemState>) kept by the history"""
+        return self.history.get_states()
 
     def step(self, n = 1):
         """Computes n (int) integration steps returning the final (SystemState)"""
         for _ in range(n):
-            old_state = self.states[-1]
-            new_state = old_state.step(self.integrator, self.force, self.dt)
-            self.states.append(new_state)
-        return self.states[-1]
+            if self.buffers is not None:
+                front, back = self.buffers
+                self.integrator.integrate(front, self.force, self.dt, back)
+                self.buffers = [back, front]
+                self.record(back)
+            else:
+                old_state = self.history.latest
+                new_state = old_state.step(self.integrator, self.force, self.dt)
+                self.record(new_state)
+            if self.checkpointer is not None:
+                self.checkpointer.step(self)
+        return self.history.latest
 
     def step_time(self, time):
         """computes steps until some time (float)"""
-        state = self.states[-1]
+        state = self.history.latest
         while state.get_time() < time:
             state = self.step(1)
         return state
     
+    def iter_steps(self, n = None, until = None, every = 1):
+        """
+        Generator taking steps one at a time like step, so each new state passes through the history, the
+        trajectory writer and the checkpointer. Memory stays constant when the History keeps only the last states.
+        Args:
+            n (int): The most steps to take, unlimited if None.
+            until (float): Stops once the simulation time reaches this, like step_time.
+            every (int): Yields every this many steps, the final step of a finite run is always yielded.
+        Yields:
+            The latest states (SystemState) as step returns them, a buffered System may yield its own buffers
+            or states its history reuses, so a yielded state should be copied to be kept.
+        """
+        state = self.history.latest
+        count = 0
+        while (n is None or count < n) and (until is None or state.get_time() < until):
+            state = self.step(1)
+            count += 1
+            finished = (n is not None and count >= n) or (until is not None and state.get_time() >= until)
+            if count % every == 0 or finished:
+                yield state
+
     def get_state(self, i):
         """Returns tha (SystemState) with some index"""
-        return self.states[i]
+        return self.history.get_state(i)
 
     def get_state_time(self, time):
         """Returns the (SystemState) for a certain input time (float)"""
@@ -400,9 +2078,15 @@ class System:
         """Returns the timestep (float)"""
         return self.dt
 
+    def get_statistics(self):
+        """Returns the integrator step counts and the number of whole system force evaluations (dict <str, int>)"""
+        statistics = self.integrator.get_statistics()
+        statistics['force_evaluations'] = self.force.evaluations
+        return statistics
+
     def num_states(self):
         """Returns (int) the number of (SystemStates) stored"""
-        return len(self.states)
+        return len(self.history)
 
     def __str__(self):
         
@@ -417,9 +2101,7 @@ class System:
     def __mul__(self, other):
         """Returns (float) the total error between this and another (System) """
         error = 0
-        for i in range(self.num_states()):
-            my_state    = self.get_state(i)
-            other_state = other.get_state(i)
+        for my_state, other_state in zip(self.states, other.states):
             error_change = my_state * other_state
             error += error_change
         error /= self.num_states()
@@ -5,13 +5,13 @@ from Ephemeris import start_planet_particles
 
 
 integrator_1 = Integrator()
-integrator_1.switch('euler_semi_implicit')
+integrator_1.switch('semi_implicit_euler')
 integrator_2 = Integrator()
 integrator_2.switch('midpoint')
 
 
 force = Force()
-force.switch('core')
+force.switch('n_body_symmetric')
 
 
 steps = 50
@@ -0,0 +1,118 @@
+import numpy as np
+from math import pi
+
+
+def stumpff(z):
+    """Returns the Stumpff functions C(z) and S(z) (ndarray) of some values, using their series near zero"""
+    z = np.asarray(z, dtype = np.float64)
+    small = np.abs(z) < 0.1
+    root = np.sqrt(np.abs(np.where(small, 1.0, z)))
+    with np.errstate(over = 'ignore', invalid = 'ignore'):
+        elliptic_c = (1 - np.cos(root)) / (root * root)
+        elliptic_s = (root - np.sin(root)) / (root * root * root)
+        hyperbolic_c = (np.cosh(root) - 1) / (root * root)
+        hyperbolic_s = (np.sinh(root) - root) / (root * root * root)
+    series_c = 1 / 2 - z * (1 / 24 - z * (1 / 720 - z * (1 / 40320 - z / 3628800)))
+    series_s = 1 / 6 - z * (1 / 120 - z * (1 / 5040 - z * (1 / 362880 - z / 39916800)))
+    c = np.where(small, series_c, np.where(z > 0, elliptic_c, hyperbolic_c))
+    s = np.where(small, series_s, np.where(z > 0, elliptic_s, hyperbolic_s))
+    return c, s
+
+
+def universal_anomaly(distance, radial, alpha, mu, dt, tolerance = 1e-15, max_iterations = 50):
+    """
+    Solves the universal Kepler equation for the universal anomaly of many bodies at once.
+    Uses the Laguerre-Conway iteration, which converges from a rough first guess for every type of conic.
+    Args:
+        distance (ndarray): The initial distances |r0| from the central mass.
+        radial (ndarray): The initial radial velocities r0.v0 / |r0|.
+        alpha (ndarray): The reciprocal semi-major axes 2/|r0| - |v0|^2/mu, negative for hyperbolic orbits.
+        mu (ndarray): The gravitational parameters G*M.
+        dt (ndarray): The times to propagate through.
+        tolerance (float): The relative change in the anomaly at which the iteration stops.
+        max_iterations (int): The most Laguerre-Conway iterations.
+    Returns:
+        The universal anomalies (ndarray).
+    """
+    root_mu = np.sqrt(mu)
+    chi = root_mu * np.abs(alpha) * dt
+    hyperbolic = alpha < -1e-12
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        semi_major = 1 / alpha
+        sign = np.sign(dt)
+        guess = sign * np.sqrt(-semi_major) * np.log((-2 * mu * alpha * dt) / (
+            distance * radial + sign * np.sqrt(-mu * semi_major) * (1 - distance * alpha)))
+    chi = np.where(hyperbolic & np.isfinite(guess), guess, chi)
+    chi = np.where(np.abs(alpha) <= 1e-12, root_mu * dt / distance, chi)
+    degree = 5
+    for _ in range(max_iterations):
+        c, s = stumpff(alpha * chi * chi)
+        square = chi * chi
+        value = (distance * radial / root_mu * square * c + (1 - alpha * distance) * chi * square * s
+                 + distance * chi - root_mu * dt)
+        slope = (distance * radial / root_mu * chi * (1 - alpha * square * s)
+                 + (1 - alpha * distance) * square * c + distance)
+        curvature = (distance * radial / root_mu * (1 - alpha * square * c)
+                     + (1 - alpha * distance) * chi * (1 - alpha * square * s))
+        root = np.sqrt(np.abs((degree - 1) ** 2 * slope * slope - degree * (degree - 1) * value * curvature))
+        denominator = slope + np.where(slope >= 0, root, -root)
+        step = np.where(denominator != 0, degree * value / np.where(denominator != 0, denominator, 1), 0)
+        chi = chi - step
+        if np.all(np.abs(step) <= tolerance * np.maximum(np.abs(chi), 1e-300)):
+            break
+    return chi
+
+
+def propagate(positions, velocities, mu, dt):
+    """
+    Advances bodies along their two-body orbits about a central mass at the origin with universal variables.
+    Every conic section is handled, and elliptic orbits are first reduced by whole periods so long steps stay accurate.
+    Args:
+        positions (ndarray): The (K,3) positions relative to the central mass.
+        velocities (ndarray): The (K,3) velocities relative to the central mass.
+        mu (float or ndarray): The gravitational parameter G*M, or one for each body.
+        dt (float or ndarray): The time to propagate through, or one for each body.
+    Returns:
+        The (K,3) positions (ndarray) and (K,3) velocities (ndarray) after dt.
+    """
+    positions = np.asarray(positions, dtype = np.float64)
+    velocities = np.asarray(velocities, dtype = np.float64)
+    count = len(positions)
+    mu = np.broadcast_to(np.asarray(mu, dtype = np.float64), (count,))
+    dt = np.broadcast_to(np.asarray(dt, dtype = np.float64), (count,))
+    distance = np.sqrt(np.sum(positions * positions, axis = 1))
+    radial = np.sum(positions * velocities, axis = 1) / distance
+    alpha = 2 / distance - np.sum(velocities * velocities, axis = 1) / mu
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        period = 2 * pi / (np.sqrt(mu) * alpha ** 1.5)
+    bound = alpha > 1e-12
+    dt = np.where(bound, np.fmod(dt, np.where(bound, period, 1.0)), dt)
+    chi = universal_anomaly(distance, radial, alpha, mu, dt)
+    square = chi * chi
+    c, s = stumpff(alpha * square)
+    root_mu = np.sqrt(mu)
+    f = 1 - square / distance * c
+    g = dt - chi * square / root_mu * s
+    new_positions = f[:, None] * positions + g[:, None] * velocities
+    new_distance = np.sqrt(np.sum(new_positions * new_positions, axis = 1))
+    f_dot = root_mu / (distance * new_distance) * (alpha * chi * square * s - chi)
+    g_dot = 1 - square / new_distance * c
+    new_velocities = f_dot[:, None] * positions + g_dot[:, None] * velocities
+    return new_positions, new_velocities
+
+
+def orbit(position, velocity, mu, times):
+    """
+    Returns the positions and velocities of one body along its two-body orbit at many times in one call.
+    Args:
+        position (array_like): The position relative to the central mass.
+        velocity (array_like): The velocity relative to the central mass.
+        mu (float): The gravitational parameter G*M.
+        times (array_like): The times since the position and velocity.
+    Returns:
+        The (T,3) positions (ndarray) and (T,3) velocities (ndarray) at the times.
+    """
+    times = np.asarray(times, dtype = np.float64).reshape(-1)
+    positions = np.repeat(np.asarray(position, dtype = np.float64).reshape(1, 3), len(times), axis = 0)
+    velocities = np.repeat(np.asarray(velocity, dtype = np.float64).reshape(1, 3), len(times), axis = 0)
+    return propagate(positions, velocities, mu, times)
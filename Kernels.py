@@ -0,0 +1,240 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from os import cpu_count, path
+from time import perf_counter
+from Compiled import backend, set_threads, pairwise_forces, batched_pairwise_forces
+
+G = 6.6743015e-11
+
+
+def cache_size(level = 2, default = 1 << 20):
+    """Returns the size in bytes (int) of the CPU cache at some level (int), read from sysfs or a default (int) if unavailable"""
+    for directory in glob('/sys/devices/system/cpu/cpu0/cache/index*'):
+        try:
+            with open(path.join(directory, 'level')) as file:
+                if int(file.read()) != level:
+                    continue
+            with open(path.join(directory, 'size')) as file:
+                size = file.read().strip()
+        except (OSError, ValueError):
+            continue
+        scale = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}.get(size[-1:], 1)
+        return int(size.rstrip('KMG')) * scale
+    return default
+
+
+class PairwiseGravity:
+    """
+    All pairs Newtonian gravity kernel working on whole systems of numpy arrays.
+    The pair matrix is processed in blocks of rows so memory stays bounded for large N.
+    The whole system forces take one of two paths chosen by the compiled backend. When it is active the Numba
+    kernel computes them, splitting the targets across threads (int) Numba threads. Otherwise with more than one
+    thread the rows are split into tiles run on a thread pool, which overlap because numpy releases the GIL
+    inside large array operations. The tile size is tuned once per size of system, starting from the tile whose
+    temporaries fit in the L2 cache and timing its neighbours.
+    Attributes:
+        G (float): The gravitational constant.
+        block_size (int): How many target particles are processed per block.
+        cache_limit (int): The largest number of G*m_i*m_j products which are cached.
+        threads (int): The number of Numba threads, or the size of the thread pool without the compiled backend,
+            every core if None and one thread with no pool if 1.
+        thread_threshold (int): The fewest particles the thread pool is used for, the compiled kernel ignores it.
+    """
+
+    def __init__(self, G = G, block_size = 256, cache_limit = 2 ** 22, threads = 1):
+        """Initialises the kernel with a gravitational constant (float), block size (int), cache limit (int) and number of threads (int)"""
+        self.G = G
+        self.block_size = block_size
+        self.cache_limit = cache_limit
+        self.cached_masses = None
+        self.cached_products = None
+        self.threads = threads
+        self.thread_threshold = 512
+        self.executor = None
+        self.executor_threads = None
+        self.tile_sizes = {}
+
+    def products(self, masses):
+        """Returns the G*m_i*m_j products for each block (list <ndarray>), cached while the masses are unchanged"""
+        if (self.cached_masses is not None and np.array_equal(self.cached_masses, masses)
+                and len(self.cached_products[0]) == min(self.block_size, len(masses))):
+            return self.cached_products
+        n = len(masses)
+        scaled = self.G * masses
+        blocks = [np.outer(masses[start:start + self.block_size], scaled)
+                  for start in range(0, n, self.block_size)]
+        if n * n <= self.cache_limit:
+            self.cached_masses = masses.copy()
+            self.cached_products = blocks
+        return blocks
+
+    def forces(self, positions, masses):
+        """Returns the (N,3) forces (ndarray) on every particle from every other particle, by the compiled kernel, the thread pool or the serial blocks"""
+        if backend.active():
+            set_threads(self.threads)
+            return pairwise_forces(positions, masses, self.G, 0, len(masses))
+        if self.threads != 1 and len(masses) >= self.thread_threshold:
+            return self.threaded_forces(positions, masses, self.tile_size(positions, masses))
+        return self.blocked_forces(positions, masses)
+
+    def blocked_forces(self, positions, masses):
+        """Returns the (N,3) forces (ndarray) on every particle computed block by block in this thread"""
+        n = len(masses)
+        forces = np.zeros((n, 3))
+        if n * n <= self.cache_limit:
+            products = self.products(masses)
+        else:
+            products = None
+        for block, start in enumerate(range(0, n, self.block_size)):
+            stop = min(start + self.block_size, n)
+            if products is not None:
+                product = products[block]
+            else:
+                product = np.outer(masses[start:stop], self.G * masses)
+            forces[start:stop] = self.block_forces(positions[start:stop], positions, product)
+        return forces
+
+    def pool(self):
+        """Returns the (ThreadPoolExecutor) the tiles run on, started again if the number of threads changed"""
+        threads = self.threads or cpu_count() or 1
+        if self.executor is None or self.executor_threads != threads:
+            if self.executor is not None:
+                self.executor.shutdown()
+            self.executor = ThreadPoolExecutor(max_workers = threads)
+            self.executor_threads = threads
+        return self.executor
+
+    def threaded_forces(self, positions, masses, tile):
+        """Returns the (N,3) forces (ndarray) on every particle, computing tiles of some number (int) of target rows on the thread pool"""
+        n = len(masses)
+        forces = np.empty((n, 3))
+        scaled = self.G * masses
+
+        def run(start):
+            stop = min(start + tile, n)
+            product = np.outer(masses[start:stop], scaled)
+            forces[start:stop] = self.block_forces(positions[start:stop], positions, product)
+
+        list(self.pool().map(run, range(0, n, tile)))
+        return forces
+
+    def tile_size(self, positions, masses):
+        """
+        Returns the tile size (int) for a system, tuned on the first call for each power of two number of particles.
+        The first guess keeps the four (tile,N,3) temporaries of a tile in the L2 cache, and it and the sizes
+        half and double it are timed on the system itself.
+        """
+        n = len(masses)
+        key = n.bit_length()
+        if key not in self.tile_sizes:
+            guess = max(cache_size() // (4 * 3 * 8 * n), 1)
+            guess = 1 << (guess.bit_length() - 1)
+            candidates = sorted({min(max(size, 8), n) for size in [guess // 2, guess, guess * 2]})
+            timings = []
+            for size in candidates:
+                start = perf_counter()
+                self.threaded_forces(positions, masses, size)
+                timings.append(perf_counter() - start)
+            self.tile_sizes[key] = candidates[int(np.argmin(timings))]
+        return self.tile_sizes[key]
+
+    def symmetric_forces(self, positions, masses):
+        """
+        Returns the (N,3) forces (ndarray) on every particle, evaluating each unordered pair once.
+        The force of j on i is added to i and subtracted from j, so the total force vanishes to rounding.
+        """
+        n = len(masses)
+        forces = np.zeros((n, 3))
+        scaled = self.G * masses
+        for start in range(0, n, self.block_size):
+            stop = min(start + self.block_size, n)
+            displacement = positions[None, start:, :] - positions[start:stop, None, :]
+            square_distance = np.einsum('ijk,ijk->ij', displacement, displacement)
+            upper = np.arange(start, n)[None, :] > np.arange(start, stop)[:, None]
+            upper &= square_distance != 0
+            square_distance[~upper] = 1
+            strength = np.outer(masses[start:stop], scaled[start:]) / (square_distance * np.sqrt(square_distance))
+            strength[~upper] = 0
+            pair_forces = strength[:, :, None] * displacement
+            forces[start:stop] += pair_forces.sum(axis = 1)
+            forces[start:] -= pair_forces.sum(axis = 0)
+        return forces
+
+    def force_on(self, position, mass, positions, masses):
+        """Returns the force (ndarray) on a single particle at some position (array_like) with some mass (float)"""
+        product = (self.G * mass) * masses[None, :]
+        target = np.asarray(position, dtype = np.float64)[None, :]
+        return self.block_forces(target, positions, product)[0]
+
+    def batched_forces(self, positions, masses):
+        """
+        Returns the forces on every particle of many independent systems of the same size in one call.
+        Small systems are stacked into chunks of about block_size^2 pairs so each numpy call covers many systems,
+        systems larger than a block use the blocked kernel one at a time.
+        Args:
+            positions (ndarray): The (B,N,3) positions of every system.
+            masses (ndarray): The (B,N) masses of every system.
+        Returns:
+            The (B,N,3) forces (ndarray).
+        """
+        if backend.active():
+            set_threads(self.threads)
+            return batched_pairwise_forces(positions, masses, self.G)
+        count, n = masses.shape
+        forces = np.empty((count, n, 3))
+        if n > self.block_size:
+            for member in range(count):
+                forces[member] = self.forces(positions[member], masses[member])
+            return forces
+        chunk = max(1, self.block_size * self.block_size // max(n * n, 1))
+        for start in range(0, count, chunk):
+            stop = min(start + chunk, count)
+            displacement = positions[start:stop, None, :, :] - positions[start:stop, :, None, :]
+            square_distance = np.einsum('bijk,bijk->bij', displacement, displacement)
+            coincident = square_distance == 0
+            square_distance[coincident] = 1
+            product = masses[start:stop, :, None] * (self.G * masses[start:stop, None, :])
+            strength = product / (square_distance * np.sqrt(square_distance))
+            strength[coincident] = 0
+            forces[start:stop] = np.einsum('bij,bijk->bik', strength, displacement)
+        return forces
+
+    def forces_and_jerks(self, indices, positions, velocities, masses):
+        """
+        Returns the forces and their time derivatives on some particles from every other particle.
+        Args:
+            indices (ndarray): The indices of the target particles.
+            positions (ndarray): The (N,3) positions of every particle.
+            velocities (ndarray): The (N,3) velocities of every particle.
+            masses (ndarray): The (N,) masses of every particle.
+        Returns:
+            The (K,3) forces (ndarray) and (K,3) jerks (ndarray) on the K targets.
+        """
+        forces = np.zeros((len(indices), 3))
+        jerks = np.zeros((len(indices), 3))
+        scaled = self.G * masses
+        for start in range(0, len(indices), self.block_size):
+            block = indices[start:start + self.block_size]
+            displacement = positions[None, :, :] - positions[block, None, :]
+            relative_velocity = velocities[None, :, :] - velocities[block, None, :]
+            square_distance = np.einsum('ijk,ijk->ij', displacement, displacement)
+            coincident = square_distance == 0
+            square_distance[coincident] = 1
+            strength = np.outer(masses[block], scaled) / (square_distance * np.sqrt(square_distance))
+            strength[coincident] = 0
+            rate = 3 * np.einsum('ijk,ijk->ij', displacement, relative_velocity) / square_distance
+            forces[start:start + len(block)] = np.einsum('ij,ijk->ik', strength, displacement)
+            jerks[start:start + len(block)] = (np.einsum('ij,ijk->ik', strength, relative_velocity)
+                                               - np.einsum('ij,ijk->ik', strength * rate, displacement))
+        return forces, jerks
+
+    def block_forces(self, targets, positions, product):
+        """Returns the forces (ndarray) on a block of targets given the products G*m_i*m_j (ndarray) for the block"""
+        displacement = positions[None, :, :] - targets[:, None, :]
+        square_distance = np.einsum('ijk,ijk->ij', displacement, displacement)
+        coincident = square_distance == 0
+        square_distance[coincident] = 1
+        strength = product / (square_distance * np.sqrt(square_distance))
+        strength[coincident] = 0
+        return np.einsum('ij,ijk->ik', strength, displacement)
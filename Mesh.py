@@ -0,0 +1,201 @@
+import numpy as np
+from math import pi, sqrt
+from Kernels import G
+
+
+def erfc(x):
+    """Returns the complementary error function (ndarray) of some values, accurate to about 1e-7"""
+    t = 1 / (1 + 0.5 * np.abs(x))
+    polynomial = (-1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (-0.18628806
+                  + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277)))))))))
+    value = t * np.exp(-x * x + polynomial)
+    return np.where(x >= 0, value, 2 - value)
+
+
+def long_range_fraction(distance, split):
+    """Returns the fraction (ndarray) of the 1/r^2 force at some distances carried by the mesh"""
+    ratio = distance / (2 * split)
+    return 1 - erfc(ratio) - distance / (split * sqrt(pi)) * np.exp(-ratio * ratio)
+
+
+class ParticleMesh:
+    """
+    Particle-mesh gravity solver with an optional P3M short range correction.
+    Masses are deposited on a grid with cloud-in-cell weights, the Poisson equation is solved with FFTs
+    and the field is interpolated back with the same weights. The force is split with a Gaussian so the
+    mesh only carries the long range part, the short range part is summed directly over nearby pairs.
+    Attributes:
+        grid_size (int): The number of mesh cells along each side.
+        periodic (bool): Whether the box is periodic, otherwise the mesh is zero padded for isolated boundaries.
+        box_size (float): The side of the periodic box with its corner at the origin, the bounding cube if None.
+        split (float): The force split scale in mesh cells.
+        cutoff (float): The short range cutoff in units of the split scale.
+        short_range (bool): Whether to add the direct short range correction.
+        G (float): The gravitational constant.
+    """
+
+    def __init__(self, grid_size = 64, periodic = False, box_size = None, split = 2.0, cutoff = 4.5,
+                 short_range = True, G = G):
+        """Initialises the solver with a grid size (int), boundary (bool), box size (float), split (float), cutoff (float), correction (bool) and G (float)"""
+        self.grid_size = grid_size
+        self.periodic = periodic
+        self.box_size = box_size
+        self.split = split
+        self.cutoff = cutoff
+        self.short_range = short_range
+        self.G = G
+        self.kernels = {}
+
+    def forces(self, positions, masses):
+        """Returns the (N,3) forces (ndarray) on every particle"""
+        return masses[:, None] * self.field(positions, masses)
+
+    def field(self, positions, masses):
+        """Returns the (N,3) gravitational field (ndarray) at every particle"""
+        if len(masses) == 0:
+            return np.zeros((0, 3))
+        size = self.grid_size
+        if self.periodic:
+            if self.box_size is None:
+                lower = positions.min(axis = 0)
+                box_size = float(np.max(positions.max(axis = 0) - lower)) * (1 + 1e-9) or 1.0
+            else:
+                lower = np.zeros(3)
+                box_size = self.box_size
+            spacing = box_size / size
+        else:
+            lower = positions.min(axis = 0)
+            extent = float(np.max(positions.max(axis = 0) - lower)) or 1.0
+            spacing = extent / (size - 3)
+            lower = lower - spacing
+            box_size = spacing * size
+        grid_positions = (positions - lower) / spacing
+        if self.periodic:
+            grid_positions %= size
+
+        cells = np.floor(grid_positions).astype(np.int64)
+        fractions = grid_positions - cells
+        corners = []
+        for corner in np.ndindex(2, 2, 2):
+            index = (cells + corner) % size
+            weight = np.prod(np.where(corner, fractions, 1 - fractions), axis = 1)
+            corners.append((np.ravel_multi_index(index.T, (size,) * 3), weight))
+
+        mass_grid = np.zeros(size ** 3)
+        for index, weight in corners:
+            mass_grid += np.bincount(index, masses * weight, size ** 3)
+        mass_grid = mass_grid.reshape((size,) * 3)
+
+        if self.periodic:
+            grids = self.periodic_field(mass_grid, spacing)
+        else:
+            grids = self.isolated_field(mass_grid, spacing)
+
+        field = np.zeros((len(masses), 3))
+        for axis in range(3):
+            flat = grids[axis].reshape(-1)
+            for index, weight in corners:
+                field[:, axis] += weight * flat[index]
+
+        if self.short_range:
+            field += self.short_range_field(positions, masses, spacing, lower, box_size)
+        return field
+
+    def window(self, size, spacing, shape):
+        """Returns the squared cloud-in-cell window (ndarray) of a grid with some size (int), spacing (float) and real shape (tuple)"""
+        window = 1.0
+        for axis, length in enumerate(shape):
+            if axis == 2:
+                frequencies = np.fft.rfftfreq(length)
+            else:
+                frequencies = np.fft.fftfreq(length)
+            value = np.sinc(frequencies) ** 2
+            reshape = [1, 1, 1]
+            reshape[axis] = len(frequencies)
+            window = window * value.reshape(reshape)
+        return window * window
+
+    def periodic_field(self, mass_grid, spacing):
+        """Returns the 3 long range field grids (list <ndarray>) of a periodic mass grid"""
+        size = self.grid_size
+        density = np.fft.rfftn(mass_grid / spacing ** 3)
+        kx = 2 * pi * np.fft.fftfreq(size, spacing)[:, None, None]
+        ky = 2 * pi * np.fft.fftfreq(size, spacing)[None, :, None]
+        kz = 2 * pi * np.fft.rfftfreq(size, spacing)[None, None, :]
+        square_k = kx * kx + ky * ky + kz * kz
+        square_k[0, 0, 0] = 1
+        split = self.split * spacing
+        potential = -4 * pi * self.G * density * np.exp(-square_k * split * split) / square_k
+        potential /= self.window(size, spacing, mass_grid.shape)
+        potential[0, 0, 0] = 0
+        return [np.fft.irfftn(-1j * k * potential, mass_grid.shape, axes = (0, 1, 2)) for k in (kx, ky, kz)]
+
+    def isolated_field(self, mass_grid, spacing):
+        """Returns the 3 long range field grids (list <ndarray>) of a zero padded mass grid"""
+        size = self.grid_size
+        shape = (2 * size,) * 3
+        transform = np.fft.rfftn(mass_grid, shape, axes = (0, 1, 2))
+        kernels = self.isolated_kernels(size)
+        return [np.fft.irfftn(transform * kernel, shape, axes = (0, 1, 2))[:size, :size, :size] * (self.G / spacing ** 2)
+                for kernel in kernels]
+
+    def isolated_kernels(self, size):
+        """
+        Returns the transformed long range field kernels (list <ndarray>) for a unit mass and unit spacing.
+        The kernels are not divided by the cloud-in-cell window like the periodic potential, as the kernel is
+        cut off at the edge of the padded box and deconvolving that jump rings onto distant particles.
+        """
+        key = (size, self.split)
+        if key in self.kernels:
+            return self.kernels[key]
+        offsets = np.fft.fftfreq(2 * size, 1 / (2 * size))
+        x, y, z = np.meshgrid(offsets, offsets, offsets, indexing = 'ij')
+        distance = np.sqrt(x * x + y * y + z * z)
+        distance[0, 0, 0] = 1
+        strength = -long_range_fraction(distance, self.split) / distance ** 3
+        strength[0, 0, 0] = 0
+        kernels = [np.fft.rfftn(strength * offset) for offset in (x, y, z)]
+        self.kernels[key] = kernels
+        return kernels
+
+    def short_range_field(self, positions, masses, spacing, lower, box_size):
+        """Returns the (N,3) direct field (ndarray) of pairs closer than the cutoff, minus the mesh part"""
+        split = self.split * spacing
+        cutoff = self.cutoff * split
+        cells = max(int(box_size // cutoff), 1)
+        if self.periodic and cells < 3:
+            cells = 1
+        cell_width = box_size / cells
+        cell_index = np.clip(((positions - lower) / cell_width).astype(np.int64) % cells, 0, cells - 1)
+        flat_index = np.ravel_multi_index(cell_index.T, (cells,) * 3)
+        order = np.argsort(flat_index, kind = 'stable')
+        occupied, first, counts = np.unique(flat_index[order], return_index = True, return_counts = True)
+        lookup = -np.ones((cells,) * 3, dtype = np.int64)
+        occupied_index = np.array(np.unravel_index(occupied, (cells,) * 3)).T
+        lookup[tuple(occupied_index.T)] = np.arange(len(occupied))
+        neighbourhood = np.array(list(np.ndindex(3, 3, 3))) - 1
+        if cells == 1:
+            neighbourhood = np.zeros((1, 3), dtype = np.int64)
+
+        field = np.zeros((len(masses), 3))
+        for row in range(len(occupied)):
+            targets = order[first[row]:first[row] + counts[row]]
+            neighbours = occupied_index[row] + neighbourhood
+            if self.periodic:
+                neighbours %= cells
+            else:
+                inside = np.all((neighbours >= 0) & (neighbours < cells), axis = 1)
+                neighbours = neighbours[inside]
+            neighbours = lookup[tuple(neighbours.T)]
+            neighbours = neighbours[neighbours >= 0]
+            sources = order[np.concatenate([np.arange(first[n], first[n] + counts[n]) for n in neighbours])]
+            displacement = positions[sources][None, :, :] - positions[targets][:, None, :]
+            if self.periodic:
+                displacement -= box_size * np.round(displacement / box_size)
+            distance = np.sqrt(np.einsum('ijk,ijk->ij', displacement, displacement))
+            close = (distance > 0) & (distance < cutoff)
+            distance[~close] = 1
+            strength = masses[sources][None, :] * (1 - long_range_fraction(distance, split)) / distance ** 3
+            strength[~close] = 0
+            field[targets] = np.einsum('ij,ijk->ik', strength, displacement)
+        return self.G * field
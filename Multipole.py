@@ -0,0 +1,249 @@
+import numpy as np
+from math import factorial, ceil, log
+from time import perf_counter
+from Kernels import G
+
+
+def multi_indices(order):
+    """Returns all (list <tuple>) multi-indices (a,b,c) with a+b+c <= order sorted by total order"""
+    indices = []
+    for total in range(order + 1):
+        for a in range(total, -1, -1):
+            for b in range(total - a, -1, -1):
+                indices.append((a, b, total - a - b))
+    return indices
+
+
+def monomials(points, indices):
+    """Returns the (K,M) scaled monomials v^k / k! (ndarray) of some (K,3) points for each multi-index"""
+    order = max(sum(index) for index in indices)
+    powers = points[:, :, None] ** np.arange(order + 1)
+    a, b, c = np.array(indices).T
+    scale = np.array([1 / (factorial(i) * factorial(j) * factorial(k)) for i, j, k in indices])
+    return powers[:, 0, a] * powers[:, 1, b] * powers[:, 2, c] * scale
+
+
+def derivatives(points, indices):
+    """
+    Returns the derivatives D^k (1/|x|) (ndarray) evaluated at some (K,3) points for every multi-index k.
+    Uses the recurrence for the Taylor coefficients a_k = D^k (1/|x|) / k!:
+        |k| r^2 a_k + (2|k|-1) sum_i x_i a_(k-e_i) + (|k|-1) sum_i a_(k-2e_i) = 0
+    """
+    lookup = {index: i for i, index in enumerate(indices)}
+    square_distance = np.sum(points * points, axis = 1)
+    coefficients = np.zeros((len(points), len(indices)))
+    coefficients[:, lookup[(0, 0, 0)]] = 1 / np.sqrt(square_distance)
+    for index in indices[1:]:
+        total = sum(index)
+        value = np.zeros(len(points))
+        for axis in range(3):
+            lower = list(index)
+            lower[axis] -= 1
+            if lower[axis] >= 0:
+                value += (2 * total - 1) * points[:, axis] * coefficients[:, lookup[tuple(lower)]]
+            lower[axis] -= 1
+            if lower[axis] >= 0:
+                value += (total - 1) * coefficients[:, lookup[tuple(lower)]]
+        coefficients[:, lookup[index]] = -value / (total * square_distance)
+    scale = np.array([factorial(a) * factorial(b) * factorial(c) for a, b, c in indices])
+    return coefficients * scale
+
+
+class FastMultipole:
+    """
+    Fast Multipole Method gravity solver on a uniform octree grid using Cartesian Taylor expansions.
+    Multipole and local expansions are truncated at some order, translation operators are
+    precomputed for each level, and neighbouring leaf cells interact directly.
+    Attributes:
+        order (int): The expansion order, higher is more accurate.
+        tolerance (float): If set, the order is chosen so the estimated relative error is below it.
+        leaf_size (int): The average number of particles aimed for in a leaf cell.
+        max_level (int): The deepest level of the grid.
+        G (float): The gravitational constant.
+        timings (dict): The seconds spent in the 'upward', 'downward' and 'near_field' passes of the last evaluation.
+    """
+
+    convergence_ratio = 0.4
+    max_order = 10
+
+    def __init__(self, order = 4, tolerance = None, leaf_size = 64, max_level = 6, G = G):
+        """Initialises the solver with an expansion order (int), tolerance (float), leaf size (int), max level (int) and G (float)"""
+        self.order = order
+        self.tolerance = tolerance
+        self.leaf_size = leaf_size
+        self.max_level = max_level
+        self.G = G
+        self.timings = {'upward': 0.0, 'downward': 0.0, 'near_field': 0.0}
+        self.operators = {}
+
+    def expansion_order(self):
+        """Returns the expansion order (int) in use, taking the tolerance into account"""
+        if self.tolerance is None:
+            return self.order
+        order = ceil(log(self.tolerance) / log(self.convergence_ratio)) - 1
+        return int(min(max(order, 1), self.max_order))
+
+    def get_timings(self):
+        """Returns the seconds (dict) spent in each pass of the last evaluation"""
+        return dict(self.timings)
+
+    def build_operators(self, order):
+        """Returns the multi-indices and the octant shift matrices (dict) for some expansion order (int)"""
+        if order in self.operators:
+            return self.operators[order]
+        indices = multi_indices(order)
+        lookup = {index: i for i, index in enumerate(indices)}
+        double_indices = multi_indices(2 * order)
+        double_lookup = {index: i for i, index in enumerate(double_indices)}
+        size = len(indices)
+        # shift[i, j] pairs multi-index i with a smaller multi-index j, differing by index i - j
+        pairs = [(i, j, tuple(x - y for x, y in zip(indices[i], indices[j])))
+                 for i in range(size) for j in range(size)
+                 if all(x >= y for x, y in zip(indices[i], indices[j]))]
+        # m2l[b, a] needs D^(a+b) with the sign (-1)^|a|
+        sums = np.array([[double_lookup[tuple(x + y for x, y in zip(indices[b], indices[a]))]
+                          for a in range(size)] for b in range(size)])
+        signs = np.array([(-1.0) ** sum(index) for index in indices])
+        gradients = [[lookup[tuple(x + (axis == k) for k, x in enumerate(index))]
+                      for index in indices if sum(index) < order] for axis in range(3)]
+        operators = {'indices': indices, 'double_indices': double_indices, 'pairs': pairs,
+                     'sums': sums, 'signs': signs, 'gradients': gradients,
+                     'low_indices': [index for index in indices if sum(index) < order]}
+        self.operators[order] = operators
+        return operators
+
+    def shift_matrix(self, operators, displacement):
+        """Returns the (M,M) matrix S[i,j] = d^(i-j)/(i-j)! (ndarray) translating expansions by some displacement"""
+        indices = operators['indices']
+        differences = sorted(set(pair[2] for pair in operators['pairs']), key = sum)
+        values = monomials(np.array([displacement]), differences)[0]
+        value_lookup = dict(zip(differences, values))
+        matrix = np.zeros((len(indices), len(indices)))
+        for i, j, difference in operators['pairs']:
+            matrix[i, j] = value_lookup[difference]
+        return matrix
+
+    def interaction_offsets(self):
+        """Returns, for each of the 8 child parities, the offsets (list <tuple>) of its interaction list"""
+        offsets = {}
+        for parity in np.ndindex(2, 2, 2):
+            valid = []
+            for offset in np.ndindex(7, 7, 7):
+                offset = tuple(o - 3 for o in offset)
+                if max(abs(o) for o in offset) <= 1:
+                    continue
+                if all(abs((p + o) // 2) <= 1 for p, o in zip(parity, offset)):
+                    valid.append(offset)
+            offsets[parity] = valid
+        return offsets
+
+    def forces(self, positions, masses):
+        """Returns the (N,3) forces (ndarray) on every particle"""
+        return masses[:, None] * self.field(positions, masses)
+
+    def field(self, positions, masses):
+        """Returns the (N,3) gravitational field (ndarray) at every particle"""
+        if len(masses) == 0:
+            return np.zeros((0, 3))
+        order = self.expansion_order()
+        operators = self.build_operators(order)
+        indices = operators['indices']
+        num_particles = len(masses)
+        size = len(indices)
+
+        start = perf_counter()
+        lower = positions.min(axis = 0)
+        width = float(np.max(positions.max(axis = 0) - lower)) * (1 + 1e-9) or 1.0
+        # refine clustered distributions until no leaf holds far more than the leaf size
+        levels = ceil(log(max(num_particles / self.leaf_size, 1)) / log(8))
+        levels = int(min(max(levels, 2), self.max_level))
+        while True:
+            cells = 2 ** levels
+            leaf_width = width / cells
+            leaf_index = np.clip(((positions - lower) / leaf_width).astype(np.int64), 0, cells - 1)
+            flat_index = np.ravel_multi_index(leaf_index.T, (cells, cells, cells))
+            if levels >= self.max_level or np.bincount(flat_index).max() <= 8 * self.leaf_size:
+                break
+            levels += 1
+        centres = lower + (leaf_index + 0.5) * leaf_width
+
+        # upward pass: particle to multipole then multipole to multipole
+        weights = masses[:, None] * monomials(positions - centres, indices)
+        multipoles = {levels: np.stack([np.bincount(flat_index, weights[:, i], cells ** 3) for i in range(size)],
+                                       axis = 1).reshape(cells, cells, cells, size)}
+        for level in range(levels - 1, 1, -1):
+            child_width = width / 2 ** (level + 1)
+            count = 2 ** level
+            parent = np.zeros((count, count, count, size))
+            child = multipoles[level + 1]
+            for octant in np.ndindex(2, 2, 2):
+                shift = (np.array(octant) - 0.5) * child_width
+                matrix = self.shift_matrix(operators, shift)
+                parent += child[octant[0]::2, octant[1]::2, octant[2]::2] @ matrix.T
+            multipoles[level] = parent
+        self.timings['upward'] = perf_counter() - start
+
+        # downward pass: multipole to local over the interaction lists then local to local
+        start = perf_counter()
+        offsets = self.interaction_offsets()
+        locals_ = None
+        for level in range(2, levels + 1):
+            count = 2 ** level
+            cell_width = width / count
+            local = np.zeros((count, count, count, size))
+            if locals_ is not None:
+                for octant in np.ndindex(2, 2, 2):
+                    shift = (np.array(octant) - 0.5) * cell_width
+                    matrix = self.shift_matrix(operators, shift)
+                    local[octant[0]::2, octant[1]::2, octant[2]::2] += locals_ @ matrix
+            padded = np.pad(multipoles[level], ((3, 3), (3, 3), (3, 3), (0, 0)))
+            all_offsets = sorted(set(offset for valid in offsets.values() for offset in valid))
+            separations = -np.array(all_offsets, dtype = np.float64) * cell_width
+            tensors = derivatives(separations, operators['double_indices'])
+            kernels = {offset: tensors[i][operators['sums']] * operators['signs'][None, :]
+                       for i, offset in enumerate(all_offsets)}
+            for parity, valid in offsets.items():
+                target = local[parity[0]::2, parity[1]::2, parity[2]::2]
+                for offset in valid:
+                    start_index = [p + o + 3 for p, o in zip(parity, offset)]
+                    source = padded[start_index[0]:start_index[0] + count:2,
+                                    start_index[1]:start_index[1] + count:2,
+                                    start_index[2]:start_index[2] + count:2]
+                    target += source @ kernels[offset].T
+            locals_ = local
+
+        # local to particle, the field is G times the gradient of the local expansion
+        particle_locals = locals_.reshape(-1, size)[flat_index]
+        low = monomials(positions - centres, operators['low_indices'])
+        field = np.stack([np.einsum('ij,ij->i', particle_locals[:, operators['gradients'][axis]], low)
+                          for axis in range(3)], axis = 1) * self.G
+        self.timings['downward'] = perf_counter() - start
+
+        start = perf_counter()
+        field += self.near_field(positions, masses, flat_index, leaf_index, cells)
+        self.timings['near_field'] = perf_counter() - start
+        return field
+
+    def near_field(self, positions, masses, flat_index, leaf_index, cells):
+        """Returns the (N,3) field (ndarray) from particles in the same or adjacent leaf cells"""
+        order = np.argsort(flat_index, kind = 'stable')
+        occupied, first, counts = np.unique(flat_index[order], return_index = True, return_counts = True)
+        lookup = -np.ones((cells + 2,) * 3, dtype = np.int64)
+        cell_index = np.array(np.unravel_index(occupied, (cells,) * 3)).T
+        lookup[tuple((cell_index + 1).T)] = np.arange(len(occupied))
+        neighbourhood = np.array(list(np.ndindex(3, 3, 3)))
+
+        field = np.zeros((len(masses), 3))
+        for row in range(len(occupied)):
+            targets = order[first[row]:first[row] + counts[row]]
+            neighbours = lookup[tuple((cell_index[row] + neighbourhood).T)]
+            neighbours = neighbours[neighbours >= 0]
+            sources = order[np.concatenate([np.arange(first[n], first[n] + counts[n]) for n in neighbours])]
+            displacement = positions[sources][None, :, :] - positions[targets][:, None, :]
+            square_distance = np.einsum('ijk,ijk->ij', displacement, displacement)
+            coincident = square_distance == 0
+            square_distance[coincident] = 1
+            strength = masses[sources][None, :] / (square_distance * np.sqrt(square_distance))
+            strength[coincident] = 0
+            field[targets] = np.einsum('ij,ijk->ik', strength, displacement)
+        return self.G * field
@@ -0,0 +1,147 @@
+import numpy as np
+from multiprocessing import get_context, resource_tracker, shared_memory
+from os import cpu_count
+from Compiled import backend, set_threads, pairwise_forces
+from Kernels import PairwiseGravity, G
+from Tree import Octree
+
+tree_fields = ['centres', 'sizes', 'masses', 'coms', 'children', 'starts', 'stops', 'order', 'leaves',
+               'positions', 'particle_masses']
+attached = {}
+
+
+def pool_context():
+    """
+    Returns the multiprocessing context (BaseContext) worker pools are started from, spawning fresh processes.
+    Workers are never forked from a process running compiled kernel threads, which some threading layers do not
+    survive, so scripts starting pools need an if __name__ == '__main__': guard.
+    """
+    return get_context('spawn')
+
+
+def view(descriptor):
+    """Returns the ndarray in shared memory described by a (role, name, shape, dtype) descriptor (tuple), attaching it once per process"""
+    role, name, shape, dtype = descriptor
+    memory = attached.get(role)
+    if memory is None or memory.name != name:
+        if memory is not None:
+            memory.close()
+        memory = shared_memory.SharedMemory(name = name)
+        attached[role] = memory
+    return np.ndarray(shape, dtype = dtype, buffer = memory.buf)
+
+
+def pairwise_task(descriptors, start, stop, G, block_size, compiled):
+    """
+    Writes the direct-sum forces on the targets start to stop (int) into the shared forces, with the compiled
+    kernel on one thread if compiled (bool) and otherwise block by block like PairwiseGravity.forces.
+    """
+    positions = view(descriptors['positions'])
+    masses = view(descriptors['masses'])
+    forces = view(descriptors['forces'])
+    if compiled:
+        set_threads(1)
+        forces[start:stop] = pairwise_forces(positions, masses, G, start, stop)
+        return
+    kernel = PairwiseGravity(G, block_size)
+    scaled = G * masses
+    for block in range(start, stop, block_size):
+        end = min(block + block_size, stop)
+        product = np.outer(masses[block:end], scaled)
+        forces[block:end] = kernel.block_forces(positions[block:end], positions, product)
+
+
+def tree_task(descriptors, start, stop, theta, softening, G):
+    """Writes the Barnes-Hut forces on the targets between start and stop (int) in tree order into the shared forces"""
+    tree = Octree.__new__(Octree)
+    for field in tree_fields:
+        setattr(tree, field, view(descriptors[field]))
+    targets = tree.order[start:stop]
+    forces = view(descriptors['forces'])
+    field = tree.field(tree.positions[targets], theta, softening, G)
+    forces[targets] = tree.particle_masses[targets, None] * field
+
+
+class ParallelForces:
+    """
+    Splits the target particles of the direct-sum and Barnes-Hut force kernels across a pool of worker processes.
+    Positions, masses and the tree are copied once per evaluation into shared memory which the persistent
+    workers attach to, so only small task descriptors are sent between processes. Each target's force is
+    computed by exactly one task with the same arithmetic as the serial kernel, so the result does not depend
+    on the number of workers or the order tasks finish in. While the compiled backend is active the direct-sum
+    tasks run the compiled kernel on one thread each, the workers taking the place of Numba's threads.
+    Attributes:
+        workers (int): The number of worker processes, every core if None.
+        chunks_per_worker (int): How many tasks the targets are split into per worker, for load balancing.
+    """
+
+    def __init__(self, workers = None, chunks_per_worker = 4):
+        """Initialises the pool settings with a number of workers (int) and chunks per worker (int), the pool starts on first use"""
+        self.workers = workers or cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self.pool = None
+        self.blocks = {}
+
+    def start(self):
+        """Starts the worker processes if they are not running, sharing this process's resource tracker so they do not free the shared memory"""
+        if self.pool is None:
+            resource_tracker.ensure_running()
+            self.pool = pool_context().Pool(self.workers)
+
+    def publish(self, role, array):
+        """Copies an array (ndarray) into the shared memory block for some role (str), returning its descriptor (tuple)"""
+        array = np.ascontiguousarray(array)
+        memory = self.blocks.get(role)
+        if memory is None or memory.size < max(array.nbytes, 1):
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+            memory = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+            self.blocks[role] = memory
+        np.ndarray(array.shape, dtype = array.dtype, buffer = memory.buf)[...] = array
+        return (role, memory.name, array.shape, array.dtype.str)
+
+    def output(self, count):
+        """Returns the descriptor (tuple) and view (ndarray) of a shared (count,3) forces array"""
+        descriptor = self.publish('forces', np.zeros((count, 3)))
+        return descriptor, np.ndarray((count, 3), dtype = np.float64, buffer = self.blocks['forces'].buf)
+
+    def ranges(self, count, align = 1):
+        """Returns the (start, stop) ranges (list <tuple>) splitting count (int) targets into tasks, starting at multiples of align (int)"""
+        tasks = self.workers * self.chunks_per_worker
+        size = -(-count // tasks)
+        size = -(-size // align) * align
+        return [(start, min(start + size, count)) for start in range(0, count, size)]
+
+    def pairwise_forces(self, positions, masses, G = G, block_size = 256):
+        """Returns the (N,3) direct-sum forces (ndarray) on every particle"""
+        self.start()
+        descriptors = {'positions': self.publish('positions', positions), 'masses': self.publish('masses', masses)}
+        descriptors['forces'], forces = self.output(len(masses))
+        compiled = backend.active()
+        self.pool.starmap(pairwise_task, [(descriptors, start, stop, G, block_size, compiled)
+                                          for start, stop in self.ranges(len(masses), block_size)], chunksize = 1)
+        return forces.copy()
+
+    def tree_forces(self, tree, theta = 0.5, softening = 0.0, G = G):
+        """Returns the (N,3) Barnes-Hut forces (ndarray) on every particle of an (Octree)"""
+        self.start()
+        descriptors = {field: self.publish('tree_' + field, getattr(tree, field)) for field in tree_fields}
+        descriptors['forces'], forces = self.output(len(tree.particle_masses))
+        self.pool.starmap(tree_task, [(descriptors, start, stop, theta, softening, G)
+                                      for start, stop in self.ranges(len(tree.particle_masses))], chunksize = 1)
+        return forces.copy()
+
+    def close(self):
+        """Stops the workers and frees the shared memory"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for memory in self.blocks.values():
+            memory.close()
+            memory.unlink()
+        self.blocks = {}
+
+    def __del__(self):
+        self.close()
@@ -1,14 +1,18 @@
-from numpy import sqrt
+from math import sqrt
 
 class Vector:
     """
     Class for handling vectors.
+    Operators which return a Vector allocate a new one, the in-place operators and add_scaled
+    update this Vector without allocating.
     Attributes:
         x (float): The x component of the vector.
         y (float): The y component of the vector.
         z (float): The z component of the vector.
     """
 
+    __slots__ = ('x', 'y', 'z')
+
     def __init__(self, x, y, z):
         """
         Returns a Vector object.
@@ -29,28 +33,19 @@ class Vector:
 
     def __add__(self, other):
         """Operator adds two Vectors together."""
-        x = self.x + other.x
-        y = self.y + other.y
-        z = self.z + other.z
-        return Vector(x,y,z)
+        return Vector(self.x + other.x, self.y + other.y, self.z + other.z)
     
     def __sub__(self, other):
         """Operator subtracts two Vectors"""
-        x = self.x - other.x
-        y = self.y - other.y
-        z = self.z - other.z
-        return Vector(x,y,z)
+        return Vector(self.x - other.x, self.y - other.y, self.z - other.z)
 
     def __mul__(self, other):
         """Operator left multiplies a Vector by a float"""
-        x = self.x * other
-        y = self.y * other
-        z = self.z * other
-        return Vector(x,y,z)
+        return Vector(self.x * other, self.y * other, self.z * other)
     
     def __rmul__(self, other):
         """Operator right multiplies a Vector by a float."""
-        return self.__mul__(other)
+        return Vector(self.x * other, self.y * other, self.z * other)
     
     def __truediv__(self, other):
         """Divides a Vector by a float. (Vector)"""
@@ -58,6 +53,52 @@ class Vector:
             return self.__mul__( 1 / other )
         else:
             raise ZeroDivisionError("Division of a Vector by Zero")
+
+    def __iadd__(self, other):
+        """Operator adds another Vector to this one in place."""
+        self.x += other.x
+        self.y += other.y
+        self.z += other.z
+        return self
+
+    def __isub__(self, other):
+        """Operator subtracts another Vector from this one in place."""
+        self.x -= other.x
+        self.y -= other.y
+        self.z -= other.z
+        return self
+
+    def __imul__(self, other):
+        """Operator multiplies this Vector by a float in place."""
+        self.x *= other
+        self.y *= other
+        self.z *= other
+        return self
+
+    def __itruediv__(self, other):
+        """Divides this Vector by a float in place."""
+        if other != 0:
+            return self.__imul__( 1 / other )
+        else:
+            raise ZeroDivisionError("Division of a Vector by Zero")
+
+    def add_scaled(self, other, scale):
+        """Fused multiply add, adds scale (float) times another (Vector) to this one in place, returning this Vector"""
+        self.x += scale * other.x
+        self.y += scale * other.y
+        self.z += scale * other.z
+        return self
+
+    def assign(self, other):
+        """Copies the components of another (Vector) into this one, returning this Vector"""
+        self.x = other.x
+        self.y = other.y
+        self.z = other.z
+        return self
+
+    def copy(self):
+        """Returns a new Vector (Vector) with the same components"""
+        return Vector(self.x, self.y, self.z)
         
     def square_norm(self):
         """Returns the square of the norm of this Vector. (float)"""
@@ -65,7 +106,7 @@ class Vector:
 
     def norm(self):
         """Returns the norm of this Vector (float)"""
-        return sqrt( self.square_norm())
+        return sqrt(self.x*self.x + self.y*self.y + self.z*self.z)
 
     def transpose(self):
         """Returns (list <float>) the x,y,z coordinates of the Vector """
@@ -9,7 +9,7 @@ window = gr.GraphWin("Simulation", 1000, 1000)
 
 def display_state(state, window = window, scale = 10, color = 'white'):
     for particle in state.get_particles():
-        position = particle.get_position()
+        position = particle.get_position().copy()
         position.set_y(-position.get_y())
         position *= scale
         centre_screen = Vector(window.getWidth(), window.getHeight(), 0) / 2
@@ -22,13 +22,18 @@ def display_state(state, window = window, scale = 10, color = 'white'):
 
 def display_system(system, window = window, scale = 50, time_scale = 1, color = 'white'):
 
-    states = system.get_states()
-    num_states = len(states)
-    
-    for i in range( num_states ):
-        state = states[i]
+    display_states(system.get_states(), system.get_dt(), window, scale, time_scale, color)
+
+def display_steps(system, n = None, until = None, every = 1, window = window, scale = 50, time_scale = 1, color = 'white'):
+    """Displays the states of a (System) as they are computed by System.iter_steps"""
+    states = system.iter_steps(n, until, every)
+    display_states(states, system.get_dt() * every, window, scale, time_scale, color)
+
+def display_states(states, dt, window = window, scale = 50, time_scale = 1, color = 'white'):
+    """Displays each state of any iterable of states (SystemState) as it arrives"""
+    for state in states:
         display_state(state, window, scale = scale, color = color)
-        sleep(system.get_dt() * time_scale)
+        sleep(dt * time_scale)
 
 
 
@@ -0,0 +1,101 @@
+import csv
+from itertools import product
+from os import cpu_count
+from time import perf_counter
+from Core import Integrator, Force, System, History
+from Compiled import warm_up
+from Parallel import pool_context
+
+sweep_state = None
+sweep_references = None
+
+
+def grid(integrators, forces, dts, end_times):
+    """Returns every combination (list <dict>) of integrator names (list <str>), force names (list <str>), timesteps (list <float>) and end times (list <float>)"""
+    return [{'integrator': integrator, 'force': force, 'dt': dt, 'end_time': end_time}
+            for integrator, force, dt, end_time in product(integrators, forces, dts, end_times)]
+
+
+def initialise(init_state, references):
+    """Stores the initial state and references once in a worker process and loads the compiled kernels outside the timed runs"""
+    global sweep_state, sweep_references
+    sweep_state = init_state
+    sweep_references = references
+    warm_up()
+
+
+def run_configuration(configuration):
+    """
+    Runs one configuration from the stored initial state and returns its row of results.
+    Args:
+        configuration (dict): The integrator (str), force (str), dt (float) and end_time (float), and optionally
+            integrator_options (dict) and force_options (dict) passed to the Integrator and Force.
+    Returns:
+        The configuration extended with the time reached, wall time, force evaluations, step counts and
+        the error from each reference (dict).
+    """
+    integrator = Integrator(**configuration.get('integrator_options', {}))
+    integrator.switch(configuration['integrator'])
+    force = Force(**configuration.get('force_options', {}))
+    force.switch(configuration['force'])
+    system = System(sweep_state, integrator, force, configuration['dt'], history = History('last', 1))
+    start = perf_counter()
+    end_state = system.step_time(configuration['end_time'])
+    wall_time = perf_counter() - start
+    row = dict(configuration)
+    row['time'] = end_state.get_time()
+    for name, reference in (sweep_references or {}).items():
+        if callable(reference):
+            reference = reference(configuration['end_time'])
+        row['error_' + name] = end_state * reference
+    row['wall_time'] = wall_time
+    row.update(system.get_statistics())
+    return row
+
+
+def sweep(init_state, configurations, references = None, workers = None):
+    """
+    Runs many configurations from one initial state across a pool of processes.
+    The initial state and references are sent to each worker once, and rows come back in the order of the configurations.
+    Wall times of runs sharing a machine include contention, use one worker for timing studies.
+    Workers are spawned and import the calling script, so a script calling this
+    with more than one worker must do so under if __name__ == '__main__':.
+    Args:
+        init_state (SystemState): The state every run starts from, an ArrayState also works.
+        configurations (list <dict>): The runs, as made by grid or with extra options.
+        references (dict): Reference states at the end time by name, or functions of the end time returning them.
+        workers (int): The number of processes, every core if None, and 1 runs in this process.
+    Returns:
+        The results table (list <dict>), one row per configuration.
+    """
+    workers = workers or cpu_count() or 1
+    if workers == 1:
+        initialise(init_state, references)
+        return [run_configuration(configuration) for configuration in configurations]
+    with pool_context().Pool(workers, initialise, (init_state, references)) as pool:
+        return pool.map(run_configuration, configurations, chunksize = 1)
+
+
+def format_table(rows, columns = None):
+    """Returns the rows (list <dict>) as an aligned text table (str) of some columns (list <str>), every column if None"""
+    if columns is None:
+        columns = []
+        for row in rows:
+            columns += [column for column in row if column not in columns]
+    cells = [[column for column in columns]]
+    for row in rows:
+        cells.append(['%.6g' % row[column] if isinstance(row.get(column), float) else str(row.get(column, ''))
+                      for column in columns])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(columns))]
+    return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells)
+
+
+def save_csv(rows, filename):
+    """Writes the rows (list <dict>) to a CSV file (str)"""
+    columns = []
+    for row in rows:
+        columns += [column for column in row if column not in columns]
+    with open(filename, 'w', newline = '') as file:
+        writer = csv.DictWriter(file, fieldnames = columns)
+        writer.writeheader()
+        writer.writerows(rows)
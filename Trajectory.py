@@ -0,0 +1,180 @@
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from Core import ArrayState
+
+
+class TrajectoryWriter:
+    """
+    Streams the positions, velocities and times of a run into chunked memory-mapped .npy files.
+    Chunk k of a directory holds times_k.npy (S,), positions_k.npy (S,N,3) and velocities_k.npy (S,N,3),
+    and trajectory.json records the layout so a TrajectoryReader can open it. The number of frames written is
+    also kept in the memory-mapped count.npy, updated after every frame, so a reader sees every frame while
+    the run progresses or after it crashes.
+    Attributes:
+        directory (str): The directory the files are written to.
+        num_particles (int): How many particles each frame holds.
+        chunk_size (int): How many frames each chunk file holds.
+        precision (str): 'float64' or 'float32' storage for positions.
+        delta (bool): Whether positions are stored as float32 offsets from the first frame of their chunk.
+        count (int): How many frames have been written.
+    """
+
+    def __init__(self, directory, num_particles, chunk_size = 1024, precision = 'float64', delta = False):
+        """Initialises a writer into some directory (str) for some number of particles (int), chunk size (int), precision (str) and delta (bool)"""
+        if precision not in ('float64', 'float32'):
+            raise ValueError("Unknown position precision " + str(precision))
+        os.makedirs(directory, exist_ok = True)
+        self.directory = directory
+        self.num_particles = num_particles
+        self.chunk_size = chunk_size
+        self.precision = 'float32' if delta else precision
+        self.delta = delta
+        self.count = 0
+        self.chunk = None
+        self.masses = None
+        self.progress = open_memmap(os.path.join(directory, 'count.npy'), 'w+', np.int64, (1,))
+
+    def path(self, name, chunk):
+        """Returns the path (str) of some file name (str) of some chunk (int)"""
+        return os.path.join(self.directory, "{}_{:05d}.npy".format(name, chunk))
+
+    def open_chunk(self, chunk):
+        """Creates the memory-mapped files (dict) of some chunk (int)"""
+        shape = (self.chunk_size, self.num_particles, 3)
+        files = {'times': open_memmap(self.path('times', chunk), 'w+', np.float64, (self.chunk_size,)),
+                 'positions': open_memmap(self.path('positions', chunk), 'w+', self.precision, shape),
+                 'velocities': open_memmap(self.path('velocities', chunk), 'w+', np.float64, shape)}
+        if self.delta:
+            files['reference'] = open_memmap(self.path('reference', chunk), 'w+', np.float64, (self.num_particles, 3))
+        return files
+
+    def write(self, state):
+        """Appends the positions, velocities and time of a (SystemState) or (ArrayState)"""
+        if not isinstance(state, ArrayState):
+            state = ArrayState.from_state(state)
+        positions, velocities = state.positions, state.velocities
+        if self.masses is None:
+            self.masses = state.masses.copy()
+            np.save(os.path.join(self.directory, 'masses.npy'), self.masses)
+        row = self.count % self.chunk_size
+        if row == 0:
+            self.flush()
+            self.chunk = self.open_chunk(self.count // self.chunk_size)
+            if self.delta:
+                self.chunk['reference'][:] = positions
+        self.chunk['times'][row] = state.get_time()
+        self.chunk['velocities'][row] = velocities
+        if self.delta:
+            self.chunk['positions'][row] = positions - self.chunk['reference']
+        else:
+            self.chunk['positions'][row] = positions
+        self.count += 1
+        self.progress[0] = self.count
+
+    def flush(self):
+        """Flushes the current chunk to disk and records the layout"""
+        if self.chunk is not None:
+            for array in self.chunk.values():
+                array.flush()
+        self.progress.flush()
+        metadata = {'num_particles': self.num_particles, 'chunk_size': self.chunk_size,
+                    'precision': self.precision, 'delta': self.delta, 'count': self.count}
+        with open(os.path.join(self.directory, 'trajectory.json'), 'w') as file:
+            json.dump(metadata, file)
+
+    def close(self):
+        """Flushes and releases the files"""
+        self.flush()
+        self.chunk = None
+
+
+class TrajectoryReader:
+    """
+    Reads a trajectory written by a TrajectoryWriter without building Particle objects.
+    Slices inside one chunk are zero-copy views of the memory-mapped files, except for
+    delta-compressed positions which are rebuilt from their reference frame.
+    """
+
+    def __init__(self, directory):
+        """Opens the trajectory in some directory (str)"""
+        self.directory = directory
+        with open(os.path.join(directory, 'trajectory.json')) as file:
+            metadata = json.load(file)
+        self.num_particles = metadata['num_particles']
+        self.chunk_size = metadata['chunk_size']
+        self.delta = metadata['delta']
+        self.count = metadata['count']
+        count_path = os.path.join(directory, 'count.npy')
+        if os.path.exists(count_path):
+            self.count = max(self.count, int(np.load(count_path)[0]))
+        self.masses = np.load(os.path.join(directory, 'masses.npy'))
+        self.chunks = []
+        for chunk in range((self.count + self.chunk_size - 1) // self.chunk_size):
+            files = {}
+            for name in ('times', 'positions', 'velocities', 'reference'):
+                path = os.path.join(directory, "{}_{:05d}.npy".format(name, chunk))
+                if os.path.exists(path):
+                    files[name] = np.load(path, mmap_mode = 'r')
+            self.chunks.append(files)
+        self.times = np.concatenate([files['times'] for files in self.chunks])[:self.count] if self.chunks else np.zeros(0)
+
+    def num_frames(self):
+        """Returns the number of frames stored (int)"""
+        return self.count
+
+    def get_times(self):
+        """Returns the times (ndarray) of every frame"""
+        return self.times
+
+    def get_masses(self):
+        """Returns the (N,) masses (ndarray)"""
+        return self.masses
+
+    def frames(self, start_time = None, end_time = None):
+        """Returns the first and one past the last frame index (tuple <int>) within a time range (float)"""
+        first = 0 if start_time is None else int(np.searchsorted(self.times, start_time, 'left'))
+        last = self.count if end_time is None else int(np.searchsorted(self.times, end_time, 'right'))
+        return first, last
+
+    def iter_chunks(self, name, start_time = None, end_time = None, particles = None):
+        """Yields the (times, array) pieces (tuple <ndarray>) of 'positions' or 'velocities' in a time range, one per chunk"""
+        first, last = self.frames(start_time, end_time)
+        particles = slice(None) if particles is None else particles
+        for chunk in range(first // self.chunk_size, (last + self.chunk_size - 1) // self.chunk_size):
+            offset = chunk * self.chunk_size
+            rows = slice(max(first - offset, 0), min(last - offset, self.chunk_size))
+            files = self.chunks[chunk]
+            values = files[name][rows, particles]
+            if name == 'positions' and self.delta:
+                values = values + files['reference'][particles]
+            yield files['times'][rows], values
+
+    def read(self, name, start_time = None, end_time = None, particles = None):
+        """Returns the 'positions' or 'velocities' (ndarray) in a time range for some particle index or slice"""
+        pieces = [values for times, values in self.iter_chunks(name, start_time, end_time, particles)]
+        if len(pieces) == 1:
+            return pieces[0]
+        if not pieces:
+            return np.zeros((0, self.num_particles, 3))[:, slice(None) if particles is None else particles]
+        return np.concatenate(pieces)
+
+    def get_positions(self, start_time = None, end_time = None, particles = None):
+        """Returns the positions (ndarray) in a time range for some particle index or slice"""
+        return self.read('positions', start_time, end_time, particles)
+
+    def get_velocities(self, start_time = None, end_time = None, particles = None):
+        """Returns the velocities (ndarray) in a time range for some particle index or slice"""
+        return self.read('velocities', start_time, end_time, particles)
+
+    def get_state(self, i):
+        """Returns the ith frame as an (ArrayState)"""
+        i = i % self.count
+        files = self.chunks[i // self.chunk_size]
+        row = i % self.chunk_size
+        positions = np.array(files['positions'][row], dtype = np.float64)
+        if self.delta:
+            positions += files['reference']
+        return ArrayState(positions, files['velocities'][row], self.masses, float(files['times'][row]))
+
@@ -0,0 +1,167 @@
+import numpy as np
+from Kernels import G
+
+
+class Octree:
+    """
+    Octree over a set of particles, storing the mass and centre of mass of every cell.
+    Nodes are stored in flat arrays, children[i] holds the 8 child indices of node i (-1 if empty).
+    Attributes:
+        centres (ndarray): (M,3) geometric centres of the cells.
+        sizes (ndarray): (M,) side lengths of the cells.
+        masses (ndarray): (M,) total mass in each cell.
+        coms (ndarray): (M,3) centre of mass of each cell.
+        children (ndarray): (M,8) child indices of each cell.
+        starts, stops (ndarray): (M,) range of each cell in the sorted particle order.
+        order (ndarray): (N,) particle indices sorted so every cell is contiguous.
+    """
+
+    max_depth = 48
+
+    def __init__(self, positions, masses, leaf_size = 8):
+        """Builds the tree from (N,3) positions (ndarray), (N,) masses (ndarray) and a leaf size (int)"""
+        self.positions = positions
+        self.particle_masses = masses
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(masses))
+        centres, sizes, children, starts, stops = [], [], [], [], []
+
+        lower = positions.min(axis = 0)
+        upper = positions.max(axis = 0)
+        size = float(np.max(upper - lower)) * (1 + 1e-12) or 1.0
+        stack = [(-1, 0, (lower + upper) / 2, size, 0, len(masses), 0)]
+        while stack:
+            parent, octant, centre, size, start, stop, depth = stack.pop()
+            node = len(centres)
+            centres.append(centre)
+            sizes.append(size)
+            children.append([-1] * 8)
+            starts.append(start)
+            stops.append(stop)
+            if parent >= 0:
+                children[parent][octant] = node
+            if stop - start <= leaf_size or depth >= self.max_depth:
+                continue
+            indices = self.order[start:stop]
+            codes = ((positions[indices] > centre) * [1, 2, 4]).sum(axis = 1)
+            sort = np.argsort(codes, kind = 'stable')
+            self.order[start:stop] = indices[sort]
+            bounds = np.searchsorted(codes[sort], np.arange(9)) + start
+            for child in range(8):
+                if bounds[child] == bounds[child + 1]:
+                    continue
+                offset = (np.array([child & 1, (child >> 1) & 1, (child >> 2) & 1]) - 0.5) * size / 2
+                stack.append((node, child, centre + offset, size / 2,
+                              bounds[child], bounds[child + 1], depth + 1))
+
+        self.centres = np.array(centres)
+        self.sizes = np.array(sizes)
+        self.children = np.array(children, dtype = np.int64)
+        self.starts = np.array(starts, dtype = np.int64)
+        self.stops = np.array(stops, dtype = np.int64)
+        self.leaves = np.all(self.children < 0, axis = 1)
+
+        sorted_masses = masses[self.order]
+        cumulative_mass = np.concatenate([[0.0], np.cumsum(sorted_masses)])
+        cumulative_moment = np.concatenate([np.zeros((1, 3)),
+                                            np.cumsum(sorted_masses[:, None] * positions[self.order], axis = 0)])
+        self.masses = cumulative_mass[self.stops] - cumulative_mass[self.starts]
+        moments = cumulative_moment[self.stops] - cumulative_moment[self.starts]
+        safe_masses = np.where(self.masses > 0, self.masses, 1.0)
+        self.coms = np.where(self.masses[:, None] > 0, moments / safe_masses[:, None], self.centres)
+
+    def num_nodes(self):
+        """Returns the number of cells in the tree (int)"""
+        return len(self.sizes)
+
+    def field(self, targets, theta = 0.5, softening = 0.0, G = G):
+        """
+        Computes the gravitational field at some points by walking the tree once for all of them.
+        A cell is used as a point mass when its size / distance < theta and the point lies outside it,
+        otherwise it is opened, so a particle's own mass never enters the pull of a cell.
+        Args:
+            targets (ndarray): (K,3) points at which to evaluate the field.
+            theta (float): The opening angle.
+            softening (float): The Plummer softening length.
+            G (float): The gravitational constant.
+        Returns:
+            (K,3) accelerations (ndarray), coincident particles are excluded.
+        """
+        field = np.zeros((len(targets), 3))
+        epsilon = softening * softening
+        stack = [(0, np.arange(len(targets)))]
+        while stack:
+            node, indices = stack.pop()
+            if len(indices) == 0 or self.masses[node] == 0:
+                continue
+            if self.leaves[node]:
+                sources = self.order[self.starts[node]:self.stops[node]]
+                displacement = self.positions[sources][None, :, :] - targets[indices][:, None, :]
+                square_distance = np.einsum('ijk,ijk->ij', displacement, displacement)
+                coincident = square_distance == 0
+                square_distance += epsilon
+                square_distance[coincident] = 1
+                strength = self.particle_masses[sources][None, :] / (square_distance * np.sqrt(square_distance))
+                strength[coincident] = 0
+                field[indices] += G * np.einsum('ij,ijk->ik', strength, displacement)
+                continue
+            displacement = self.coms[node] - targets[indices]
+            square_distance = np.einsum('ij,ij->i', displacement, displacement)
+            outside = np.any(np.abs(targets[indices] - self.centres[node]) > self.sizes[node] / 2, axis = 1)
+            accept = (self.sizes[node] * self.sizes[node] < theta * theta * square_distance) & outside
+            if np.any(accept):
+                softened = square_distance[accept] + epsilon
+                strength = G * self.masses[node] / (softened * np.sqrt(softened))
+                field[indices[accept]] += strength[:, None] * displacement[accept]
+            opened = indices[~accept]
+            if len(opened):
+                for child in self.children[node]:
+                    if child >= 0:
+                        stack.append((child, opened))
+        return field
+
+
+class BarnesHut:
+    """
+    Barnes-Hut O(N log N) gravity solver.
+    The octree is built once per whole system evaluation and shared by every target particle.
+    Attributes:
+        theta (float): The opening angle, smaller is more accurate.
+        softening (float): The Plummer softening length.
+        leaf_size (int): The most particles stored in a leaf cell.
+        G (float): The gravitational constant.
+    """
+
+    def __init__(self, theta = 0.5, softening = 0.0, leaf_size = 8, G = G):
+        """Initialises the solver with an opening angle (float), softening (float), leaf size (int) and G (float)"""
+        self.theta = theta
+        self.softening = softening
+        self.leaf_size = leaf_size
+        self.G = G
+        self.tree = None
+        self.tree_positions = None
+        self.tree_masses = None
+
+    def build(self, positions, masses):
+        """Returns the (Octree) for some positions and masses, reusing the last tree if they are unchanged"""
+        if (self.tree is None or not np.array_equal(self.tree_positions, positions)
+                or not np.array_equal(self.tree_masses, masses)):
+            self.tree = Octree(positions, masses, self.leaf_size)
+            self.tree_positions = positions.copy()
+            self.tree_masses = masses.copy()
+        return self.tree
+
+    def forces(self, positions, masses):
+        """Returns the (N,3) forces (ndarray) on every particle"""
+        if len(masses) == 0:
+            return np.zeros((0, 3))
+        tree = self.build(positions, masses)
+        return masses[:, None] * tree.field(positions, self.theta, self.softening, self.G)
+
+    def force_on(self, position, mass, positions, masses):
+        """Returns the force (ndarray) on a single particle at some position (array_like) with some mass (float)"""
+        if len(masses) == 0:
+            return np.zeros(3)
+        tree = self.build(positions, masses)
+        target = np.asarray(position, dtype = np.float64)[None, :]
+        return mass * tree.field(target, self.theta, self.softening, self.G)[0]
@@ -0,0 +1,46 @@
+import os
+import numpy as np
+import pytest
+from Core import ArrayState, Integrator, Force, System, History
+from Kernels import G
+from Checkpoint import Checkpointer, restart, save_checkpoint, load_checkpoint
+
+
+def make_system(name = 'dormand_prince', checkpointer = None):
+    """Returns a (System) of a random cluster with unit G*m advanced by some integrator (str)"""
+    rng = np.random.default_rng(4)
+    state = ArrayState(rng.normal(size = (6, 3)), 0.3 * rng.normal(size = (6, 3)), rng.uniform(1, 2, 6) / G, 0.0)
+    integrator = Integrator(rtol = 1e-8, atol = 1e-8)
+    integrator.switch(name)
+    force = Force()
+    force.switch('n_body_vectorized')
+    return System(state, integrator, force, 0.05, history = History('last', 1), checkpointer = checkpointer)
+
+
+@pytest.mark.parametrize('name', ['rk4', 'dormand_prince', 'gauss_radau', 'bulirsch_stoer', 'block_timestep'])
+def test_restart_is_bit_exact(tmp_path, name):
+    straight = make_system(name)
+    straight.step(10)
+    interrupted = make_system(name)
+    interrupted.step(4)
+    path = str(tmp_path / 'checkpoint.npz')
+    save_checkpoint(interrupted, path)
+    restarted = load_checkpoint(path)
+    restarted.step(6)
+    expected, state = straight.get_state(-1), restarted.get_state(-1)
+    assert state.get_time() == expected.get_time()
+    assert np.array_equal(state.positions, expected.positions)
+    assert np.array_equal(state.velocities, expected.velocities)
+
+
+def test_keep_counts_checkpoints_from_before_a_restart(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path), every_steps = 1, keep = 2)
+    system = make_system(checkpointer = checkpointer)
+    system.step(3)
+    checkpointer.close()
+    checkpointer = Checkpointer(str(tmp_path), every_steps = 1, keep = 2)
+    system = restart(str(tmp_path))
+    system.checkpointer = checkpointer
+    system.step(3)
+    checkpointer.close()
+    assert sorted(os.listdir(tmp_path)) == ['checkpoint_000000000005.npz', 'checkpoint_000000000006.npz']
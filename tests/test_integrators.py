@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from Core import ArrayState, Integrator, Force
+from Kernels import G
+
+
+def kepler_orbit(eccentricity = 0.5):
+    """Returns an (ArrayState) of a light body at the pericentre of an orbit with unit semi-major axis and unit G*M"""
+    masses = np.array([0.999, 0.001]) / G
+    distance = 1 - eccentricity
+    speed = ((1 + eccentricity) / distance) ** 0.5
+    positions = np.array([[0.0, 0.0, 0.0], [distance, 0.0, 0.0]])
+    velocities = np.array([[0.0, 0.0, 0.0], [0.0, speed, 0.0]])
+    positions -= masses @ positions / masses.sum()
+    velocities -= masses @ velocities / masses.sum()
+    return ArrayState(positions, velocities, masses, 0.0)
+
+
+def integrate(name, steps, **options):
+    """Returns the largest position or velocity error (float) of some integrator (str) after some steps (int) over unit time"""
+    force = Force()
+    force.switch('n_body_vectorized')
+    exact = Integrator()
+    exact.switch('kepler')
+    reference = exact.integrate(kepler_orbit(), force, 1.0)
+    integrator = Integrator(**options)
+    integrator.switch(name)
+    state = kepler_orbit()
+    for _ in range(steps):
+        state = integrator.integrate(state, force, 1.0 / steps)
+    return max(np.max(np.abs(state.positions - reference.positions)), np.max(np.abs(state.velocities - reference.velocities)))
+
+
+# the midpoint method moves the positions with the end of step velocity, so it is first order
+@pytest.mark.parametrize('name, order', [('euler_forwards', 1), ('euler_back', 1), ('semi_implicit_euler', 1),
+                                         ('midpoint', 1), ('rk4', 4), ('verlet', 2), ('leapfrog', 2),
+                                         ('yoshida4', 4), ('yoshida6', 6), ('forest_ruth', 4), ('wisdom_holman', 2)])
+def test_convergence_order(name, order):
+    observed = np.log2(integrate(name, 32) / integrate(name, 64))
+    assert abs(observed - order) < 0.25
+
+
+@pytest.mark.parametrize('name', ['dormand_prince', 'gauss_radau', 'bulirsch_stoer', 'block_timestep', 'kepler'])
+def test_adaptive_accuracy(name):
+    assert integrate(name, 4, rtol = 1e-10, atol = 1e-10) < 1e-7
+
+
+def collision():
+    """Returns an (ArrayState) of two unit masses released from rest a micrometre apart, which collide almost at once"""
+    return ArrayState(np.array([[0.0, 0.0, 0.0], [1e-6, 0.0, 0.0]]), np.zeros((2, 3)), np.ones(2), 0.0)
+
+
+@pytest.mark.parametrize('name', ['dormand_prince', 'gauss_radau', 'bulirsch_stoer'])
+def test_adaptive_step_underflow_raises(name):
+    integrator = Integrator()
+    integrator.switch(name)
+    force = Force()
+    force.switch('n_body_vectorized')
+    with pytest.raises(RuntimeError, match = 'underflow'):
+        integrator.integrate(collision(), force, 1.0)
+
+
+def test_extrapolation_depths_count_steps():
+    state = ArrayState(np.array([[0.5, 0.0, 0.0], [-0.5, 0.0, 0.0]]),
+                       np.array([[0.0, 0.5 ** 0.5, 0.0], [0.0, -0.5 ** 0.5, 0.0]]), np.ones(2), 0.0)
+    integrator = Integrator(rtol = 1e-10, atol = 1e-10)
+    integrator.switch('bulirsch_stoer')
+    force = Force()
+    force.switch('n_body_vectorized')
+    for _ in range(20):
+        state = integrator.integrate(state, force, 0.1)
+    depths = integrator.get_statistics()['extrapolation_depths']
+    assert sum(depths) == integrator.accepted_steps > 0
+    assert len(integrator.extrapolation_depths) == len(integrator.extrapolation_sequence) + 1
+    integrator.reset_statistics()
+    assert integrator.get_statistics()['extrapolation_depths'] == []
@@ -0,0 +1,50 @@
+import numpy as np
+from Compiled import backend
+from Core import ArrayState, Force
+from Kernels import PairwiseGravity
+
+
+def cloud(n, seed = 3):
+    """Returns the positions (ndarray) and masses (ndarray) of n random particles"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(size = (n, 3)), rng.uniform(1, 2, n)
+
+
+def test_thread_pool_matches_blocks():
+    positions, masses = cloud(600)
+    enabled = backend.enabled
+    backend.enabled = False
+    try:
+        kernel = PairwiseGravity(G = 1.0, threads = 2)
+        assert len(masses) >= kernel.thread_threshold
+        forces = kernel.forces(positions, masses)
+        assert kernel.executor is not None
+        assert np.allclose(forces, kernel.blocked_forces(positions, masses), rtol = 1e-13, atol = 0)
+    finally:
+        backend.enabled = enabled
+
+
+def test_compiled_matches_blocks():
+    positions, masses = cloud(300)
+    kernel = PairwiseGravity(G = 1.0, threads = 2)
+    assert np.allclose(kernel.forces(positions, masses), kernel.blocked_forces(positions, masses), rtol = 1e-12, atol = 0)
+
+
+def test_vectorized_matches_n_body():
+    positions, masses = cloud(40)
+    state = ArrayState(positions, np.zeros((40, 3)), masses, 0.0)
+    objects = state.to_state()
+    force = Force()
+    force.switch('n_body_vectorized')
+    vectorized = force.calculate_all(state)
+    force.switch('n_body')
+    n_body = np.array([force.calculate(particle, objects).transpose() for particle in objects.get_particles()])
+    assert np.allclose(vectorized, n_body, rtol = 1e-12, atol = 0)
+
+
+def test_symmetric_matches_forces():
+    positions, masses = cloud(700)
+    kernel = PairwiseGravity(G = 1.0)
+    symmetric = kernel.symmetric_forces(positions, masses)
+    assert np.allclose(symmetric, kernel.blocked_forces(positions, masses), rtol = 1e-12, atol = 1e-12)
+    assert np.max(np.abs(symmetric.sum(axis = 0))) < 1e-10
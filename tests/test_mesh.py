@@ -0,0 +1,52 @@
+import numpy as np
+from Kernels import PairwiseGravity
+from Mesh import ParticleMesh
+
+
+def relative_errors(forces, positions, masses):
+    """Returns the relative error (ndarray) of some forces against the direct sum on every particle"""
+    direct = PairwiseGravity(G = 1.0).forces(positions, masses)
+    return np.linalg.norm(forces - direct, axis = 1) / np.linalg.norm(direct, axis = 1)
+
+
+def test_isolated_uniform_cloud():
+    rng = np.random.default_rng(1)
+    positions = rng.uniform(size = (2000, 3))
+    masses = rng.uniform(1, 2, 2000)
+    forces = ParticleMesh(64, G = 1.0).forces(positions, masses)
+    assert np.median(relative_errors(forces, positions, masses)) < 5e-3
+
+
+def test_isolated_pair():
+    positions = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]])
+    masses = np.ones(2)
+    for grid_size in (32, 64):
+        forces = ParticleMesh(grid_size, G = 1.0).forces(positions, masses)
+        assert np.max(relative_errors(forces, positions, masses)) < 1e-6
+        assert np.max(np.abs(forces[:, 1:])) < 1e-6
+
+
+def test_isolated_few_bodies():
+    positions = np.array([[0.0, 0.0, 0.0], [1.0, 0.3, 0.0], [0.2, 0.9, 0.5]])
+    masses = np.array([1.0, 2.0, 0.5])
+    forces = ParticleMesh(64, G = 1.0).forces(positions, masses)
+    assert np.max(relative_errors(forces, positions, masses)) < 1e-3
+
+
+def test_isolated_widely_separated():
+    positions = np.array([[0.0, 0.0, 0.0], [100.0, 0.0, 0.0], [100.5, 0.0, 0.0], [50.0, 30.0, 0.0]])
+    masses = np.ones(4)
+    forces = ParticleMesh(64, G = 1.0).forces(positions, masses)
+    assert np.max(relative_errors(forces, positions, masses)) < 1e-2
+
+
+def test_periodic_close_pair():
+    positions = np.array([[0.45, 0.5, 0.5], [0.55, 0.5, 0.5]])
+    masses = np.ones(2)
+    forces = ParticleMesh(64, periodic = True, box_size = 1.0, G = 1.0).forces(positions, masses)
+    assert np.max(relative_errors(forces, positions, masses)) < 2e-2
+
+
+def test_empty_system():
+    for solver in (ParticleMesh(16), ParticleMesh(16, periodic = True)):
+        assert solver.forces(np.zeros((0, 3)), np.zeros(0)).shape == (0, 3)
@@ -0,0 +1,20 @@
+import numpy as np
+from Kernels import PairwiseGravity
+from Multipole import FastMultipole
+
+
+def test_error_falls_with_order():
+    rng = np.random.default_rng(6)
+    positions = rng.normal(size = (1000, 3))
+    masses = rng.uniform(1, 2, 1000)
+    direct = PairwiseGravity(G = 1.0).forces(positions, masses)
+    medians = []
+    for order in (2, 4, 8):
+        forces = FastMultipole(order = order, G = 1.0).forces(positions, masses)
+        medians.append(np.median(np.linalg.norm(forces - direct, axis = 1) / np.linalg.norm(direct, axis = 1)))
+    assert medians[0] > medians[1] > medians[2]
+    assert medians[2] < 1e-5
+
+
+def test_empty_system():
+    assert FastMultipole().forces(np.zeros((0, 3)), np.zeros(0)).shape == (0, 3)
@@ -0,0 +1,21 @@
+import numpy as np
+from Compiled import backend
+from Kernels import PairwiseGravity
+from Parallel import ParallelForces
+
+
+def test_pairwise_forces_match_serial():
+    rng = np.random.default_rng(2)
+    positions = rng.normal(size = (600, 3))
+    masses = rng.uniform(1, 2, 600)
+    solver = ParallelForces(2)
+    enabled = backend.enabled
+    try:
+        for compiled in (enabled, False):
+            backend.enabled = compiled
+            serial = PairwiseGravity(G = 1.0).forces(positions, masses)
+            forces = solver.pairwise_forces(positions, masses, 1.0, 128)
+            assert np.allclose(forces, serial, rtol = 1e-12, atol = 0)
+    finally:
+        backend.enabled = enabled
+        solver.close()
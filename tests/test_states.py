@@ -0,0 +1,42 @@
+import numpy as np
+from Core import ArrayState, Integrator, Force
+from Primitives import Vector
+
+
+def state():
+    """Returns a small (ArrayState) of three particles"""
+    positions = np.arange(9, dtype = float).reshape(3, 3)
+    return ArrayState(positions, np.ones((3, 3)), np.array([1.0, 2.0, 3.0]), 0.0)
+
+
+def test_view_components_write_through():
+    array_state = state()
+    particle = array_state.get_particle(1)
+    particle.position.x = -1.0
+    particle.velocity.add_scaled(Vector(1.0, 2.0, 3.0), 2.0)
+    particle.position = Vector(7.0, 8.0, particle.position.x)
+    assert array_state.positions[1].tolist() == [7.0, 8.0, -1.0]
+    assert array_state.velocities[1].tolist() == [3.0, 5.0, 7.0]
+
+
+def test_copies_own_their_masses():
+    original = state()
+    copy = original.copy()
+    into = original.copy(state())
+    copy.get_particle(0).mass = 10.0
+    into.get_particle(0).mass = 20.0
+    assert original.masses[0] == 1.0
+    assert copy.masses[0] == 10.0 and into.masses[0] == 20.0
+
+
+def test_integrated_state_owns_its_masses():
+    original = state()
+    integrator = Integrator()
+    integrator.switch('leapfrog')
+    force = Force()
+    force.switch('n_body_vectorized')
+    stepped = integrator.integrate(original, force, 0.01)
+    into = integrator.integrate(original, force, 0.01, original.copy())
+    stepped.get_particle(0).mass = 10.0
+    into.get_particle(0).mass = 20.0
+    assert original.masses[0] == 1.0
@@ -0,0 +1,49 @@
+import numpy as np
+from Core import ArrayState, Integrator, Force, System, History
+
+
+def two_body():
+    """Returns an (ArrayState) of two equal masses on a circular orbit with G = 1"""
+    positions = np.array([[0.5, 0.0, 0.0], [-0.5, 0.0, 0.0]])
+    velocities = np.array([[0.0, 0.5 ** 0.5, 0.0], [0.0, -0.5 ** 0.5, 0.0]])
+    return ArrayState(positions, velocities, np.ones(2), 0.0)
+
+
+def make_system(buffered = False, history = None):
+    integrator = Integrator()
+    integrator.switch('rk4')
+    force = Force()
+    force.switch('n_body_vectorized')
+    return System(two_body(), integrator, force, 0.01, buffered = buffered, history = history)
+
+
+def test_iter_steps_matches_step():
+    for buffered in (False, True):
+        streamed = make_system(buffered, History('all'))
+        stepped = make_system(buffered, History('all'))
+        times = [state.get_time() for state in streamed.iter_steps(10, every = 3)]
+        stepped.step(10)
+        assert np.allclose(times, [0.03, 0.06, 0.09, 0.1])
+        assert len(streamed.states) == len(stepped.states) == 11
+        assert np.array_equal(streamed.history.latest.positions, stepped.history.latest.positions)
+
+
+def test_iter_steps_until():
+    system = make_system()
+    states = list(system.iter_steps(until = 0.05))
+    assert states[-1].get_time() >= 0.05
+    assert system.history.latest is states[-1]
+
+
+def test_particle_step_matches_system_step():
+    state = two_body()
+    integrator = Integrator()
+    integrator.switch('rk4')
+    force = Force()
+    force.switch('n_body_vectorized')
+    particles = [particle.step(state, integrator, force, 0.01) for particle in state.get_particles()]
+    assert integrator.accepted_steps == 1
+    stepped = integrator.integrate(state, force, 0.01)
+    assert np.array_equal([particle.get_position().transpose() for particle in particles], stepped.positions)
+    particle = integrator.integrate(state, state.get_particle(1), force, 0.01)
+    assert particle.get_velocity().transpose() == tuple(stepped.velocities[1])
@@ -0,0 +1,40 @@
+import numpy as np
+from Core import ArrayState, Integrator, Force, System
+from Kernels import G
+from Trajectory import TrajectoryWriter, TrajectoryReader
+
+
+def run(directory, **options):
+    """Returns the (System) of a random cluster stepped 10 times while streaming its states into some directory (str)"""
+    rng = np.random.default_rng(5)
+    state = ArrayState(rng.normal(size = (5, 3)), 0.3 * rng.normal(size = (5, 3)), rng.uniform(1, 2, 5) / G, 0.0)
+    integrator = Integrator()
+    integrator.switch('leapfrog')
+    force = Force()
+    force.switch('n_body_vectorized')
+    writer = TrajectoryWriter(directory, 5, chunk_size = 4, **options)
+    system = System(state, integrator, force, 0.01, writer = writer)
+    system.step(10)
+    writer.close()
+    return system
+
+
+def test_read_back(tmp_path):
+    system = run(str(tmp_path))
+    reader = TrajectoryReader(str(tmp_path))
+    states = system.get_states()
+    assert reader.num_frames() == 11
+    assert np.array_equal(reader.get_times(), [state.get_time() for state in states])
+    assert np.array_equal(reader.get_positions(), [state.positions for state in states])
+    assert np.array_equal(reader.get_velocities(), [state.velocities for state in states])
+    assert np.array_equal(reader.get_masses(), states[0].masses)
+    assert np.array_equal(reader.get_state(6).positions, states[6].positions)
+    assert np.array_equal(reader.get_positions(0.025, 0.065, 2), [state.positions[2] for state in states[3:7]])
+
+
+def test_read_back_delta(tmp_path):
+    system = run(str(tmp_path), delta = True)
+    reader = TrajectoryReader(str(tmp_path))
+    positions = [state.positions for state in system.get_states()]
+    assert np.allclose(reader.get_positions(), positions, rtol = 0, atol = 1e-6)
+    assert np.allclose(reader.get_state(-1).positions, positions[-1], rtol = 0, atol = 1e-6)
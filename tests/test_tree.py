@@ -0,0 +1,25 @@
+import numpy as np
+from Kernels import PairwiseGravity
+from Tree import BarnesHut
+
+
+def relative_errors(forces, positions, masses):
+    """Returns the relative error (ndarray) of some forces against the direct sum on every particle"""
+    direct = PairwiseGravity(G = 1.0).forces(positions, masses)
+    return np.linalg.norm(forces - direct, axis = 1) / np.linalg.norm(direct, axis = 1)
+
+
+def test_matches_direct_sum():
+    rng = np.random.default_rng(6)
+    positions = rng.normal(size = (1000, 3))
+    masses = rng.uniform(1, 2, 1000)
+    exact = BarnesHut(theta = 0.0, G = 1.0).forces(positions, masses)
+    assert np.max(relative_errors(exact, positions, masses)) < 1e-12
+    errors = relative_errors(BarnesHut(theta = 0.3, G = 1.0).forces(positions, masses), positions, masses)
+    assert np.median(errors) < 1e-3 and np.max(errors) < 1e-2
+
+
+def test_empty_system():
+    solver = BarnesHut()
+    assert solver.forces(np.zeros((0, 3)), np.zeros(0)).shape == (0, 3)
+    assert np.array_equal(solver.force_on(np.ones(3), 1.0, np.zeros((0, 3)), np.zeros(0)), np.zeros(3))